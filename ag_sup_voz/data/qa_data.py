@@ -1,10 +1,16 @@
 """
 Arquivo para carregar perguntas e respostas (QA) de uma API ou cache local.
 Se a API não estiver disponível, usa dados embutidos como fallback.
+
+A carga inicial não acessa a rede (cache -> dados embutidos). A consulta à API
+é feita em segundo plano por `start_background_refresh()`, usando requisições
+condicionais (ETag/If-Modified-Since) e atualizações incrementais (delta).
 """
 
 import os
 import json
+import tempfile
+import threading
 import urllib.request
 import urllib.error
 
@@ -12,6 +18,8 @@ import urllib.error
 _CACHE_FILE = "qa_cache.json"
 # Pode configurar a URL da API via variável de ambiente QA_API_URL
 _API_URL = os.environ.get("QA_API_URL") 
+# Intervalo (em segundos) entre consultas à API na atualização em segundo plano
+_REFRESH_INTERVAL = float(os.environ.get("QA_REFRESH_INTERVAL", "300"))
 
 # Dados padrão embutidos (fallback)
 _default_qa = {
@@ -41,64 +49,200 @@ _default_qa = {
     "repita": "Claro — o que você quer que eu repita?"
 }
 
+# Estado compartilhado com a thread de atualização
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_listeners = []
+_validators = {}
+_stop_event = threading.Event()
+_refresher = None
+
 
 def _load_cache():
+    """Lê o cache local. Aceita o formato atual ({"qa_pairs": ..., "etag": ...,
+    "last_modified": ...}) e o formato antigo (dicionário simples de pares)."""
     try:
         with open(_CACHE_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
             if isinstance(data, dict):
-                return data
+                if isinstance(data.get("qa_pairs"), dict):
+                    validators = {k: data[k] for k in ("etag", "last_modified") if data.get(k)}
+                    return data["qa_pairs"], validators
+                return data, {}
     except Exception:
         pass
-    return None
+    return None, {}
 
 
-def _save_cache(data: dict):
+def _save_cache(data: dict, validators: dict = None):
+    """Grava o cache de forma atômica: escreve em um arquivo temporário no mesmo
+    diretório e o renomeia sobre o original, evitando caches truncados."""
+    payload = {"qa_pairs": data}
+    payload.update(validators or {})
+    cache_dir = os.path.dirname(os.path.abspath(_CACHE_FILE))
+    tmp_path = None
     try:
-        with open(_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".qa_cache.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, _CACHE_FILE)
+        tmp_path = None
     except Exception:
         pass
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
 
 
-def _fetch_from_api(url: str, timeout: int = 5) -> dict:
-    """Tenta buscar JSON da API. Formato aceito: dicionário simples {pergunta: resposta, ...}
-    ou objeto com chave 'qa_pairs'."""
+def _fetch_from_api(url: str, timeout: int = 5, validators: dict = None):
+    """Tenta buscar JSON da API com uma requisição condicional.
+
+    Retorna uma tupla (dados, validadores). `dados` é None quando o servidor
+    responde 304 (não modificado) ou em caso de erro. Formatos aceitos:
+    dicionário simples {pergunta: resposta, ...}, objeto com chave 'qa_pairs'
+    ou delta {"delta": true, "upsert": {...}, "remove": [...]}."""
+    validators = validators or {}
+    headers = {"User-Agent": "IA-BASE/1.0", "A-IM": "qa-delta"}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "IA-BASE/1.0"})
+        req = urllib.request.Request(url, headers=headers)
         with urllib.request.urlopen(req, timeout=timeout) as resp:
             raw = resp.read()
+            novos = {k: v for k, v in (("etag", resp.headers.get("ETag")),
+                                       ("last_modified", resp.headers.get("Last-Modified"))) if v}
             data = json.loads(raw.decode("utf-8"))
             if isinstance(data, dict):
-                # se o JSON tem chave 'qa_pairs', usar esse valor
-                if "qa_pairs" in data and isinstance(data["qa_pairs"], dict):
-                    return data["qa_pairs"]
-                # caso contrário assumir que é o próprio dict de pares
-                return data
-    except (urllib.error.URLError, urllib.error.HTTPError, ValueError):
+                return data, novos
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, validators
+    except (urllib.error.URLError, OSError, ValueError):
         pass
-    return None
+    return None, validators
 
 
-def refresh_qa(url: str = None) -> dict:
-    """Atualiza o dicionário de perguntas/respostas a partir da API (se disponível).
-    Retorna o dicionário usado (API, cache ou fallback)."""
-    u = url or _API_URL
-    if u:
-        fetched = _fetch_from_api(u)
-        if fetched and isinstance(fetched, dict) and len(fetched) > 0:
-            _save_cache(fetched)
-            return fetched
-    # tentar cache local
-    cached = _load_cache()
+def _apply_payload(current: dict, data: dict) -> dict:
+    """Aplica a resposta da API sobre os pares atuais (delta ou carga completa)."""
+    if data.get("delta"):
+        novos = dict(current)
+        upsert = data.get("upsert") or {}
+        if isinstance(upsert, dict):
+            novos.update(upsert)
+        for pergunta in data.get("remove") or []:
+            novos.pop(pergunta, None)
+        return novos
+    # se o JSON tem chave 'qa_pairs', usar esse valor
+    if "qa_pairs" in data and isinstance(data["qa_pairs"], dict):
+        return data["qa_pairs"]
+    # caso contrário assumir que é o próprio dict de pares
+    return data
+
+
+def _swap(novos: dict):
+    """Troca `qa_pairs` por um novo dicionário e avisa os ouvintes registrados."""
+    global qa_pairs
+    with _lock:
+        if novos == qa_pairs:
+            return
+        qa_pairs = novos
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback(novos)
+        except Exception as e:
+            print(f"[AVISO] Falha ao notificar atualização de QA: {e}")
+
+
+def _initial_load() -> dict:
+    """Carga inicial sem rede: cache local -> dados embutidos."""
+    cached, validators = _load_cache()
     if cached:
+        _validators.update(validators)
         return cached
-    # fallback para dados embutidos
     return _default_qa
 
 
-# Carregar inicialmente: tentar API -> cache -> default
-qa_pairs = refresh_qa()
+def refresh_qa(url: str = None) -> dict:
+    """Atualiza o dicionário de perguntas/respostas a partir da API (se disponível).
+    Retorna o dicionário em uso (API, cache ou fallback)."""
+    u = url or _API_URL
+    if not u:
+        return qa_pairs
+    with _refresh_lock:
+        data, validators = _fetch_from_api(u, validators=_validators)
+        if data is None:
+            return qa_pairs
+        novos = _apply_payload(qa_pairs, data)
+        if not novos:
+            return qa_pairs
+        _validators.clear()
+        _validators.update(validators)
+        _save_cache(novos, validators)
+        _swap(novos)
+    return qa_pairs
+
+
+def get_qa_pairs() -> dict:
+    """Retorna a versão atual de `qa_pairs` (útil para quem importou o módulo)."""
+    return qa_pairs
+
+
+def add_listener(callback):
+    """Registra `callback(novos_pares)`, chamado sempre que `qa_pairs` muda."""
+    with _lock:
+        _listeners.append(callback)
+
+
+def start_background_refresh(url: str = None, interval: float = None):
+    """Inicia (uma única vez) a thread que consulta a API periodicamente.
+    Não faz nada se nenhuma URL estiver configurada."""
+    global _refresher
+    u = url or _API_URL
+    if not u:
+        return None
+    if _refresher is not None and _refresher.is_alive():
+        return _refresher
+    intervalo = interval if interval is not None else _REFRESH_INTERVAL
+    _stop_event.clear()
+
+    def _loop():
+        while True:
+            try:
+                refresh_qa(u)
+            except Exception as e:
+                print(f"[AVISO] Falha ao atualizar QA: {e}")
+            if _stop_event.wait(intervalo):
+                break
+
+    _refresher = threading.Thread(target=_loop, name="qa-refresh", daemon=True)
+    _refresher.start()
+    return _refresher
+
+
+def stop_background_refresh(timeout: float = None):
+    """Interrompe a thread de atualização em segundo plano."""
+    _stop_event.set()
+    if _refresher is not None:
+        _refresher.join(timeout)
+
+
+# Carregar inicialmente sem bloquear: cache -> default
+qa_pairs = _initial_load()
 
 # Expor função para o restante do código reconsultar
-__all__ = ["qa_pairs", "refresh_qa"]
+__all__ = [
+    "qa_pairs",
+    "refresh_qa",
+    "get_qa_pairs",
+    "add_listener",
+    "start_background_refresh",
+    "stop_background_refresh",
+]
@@ -8,8 +8,11 @@ load_dotenv()
 
 from gtts import gTTS
 from models.model import responder, respostas
+from data.qa_data import start_background_refresh
+from models.artifacts import start_watching, active_version
 import threading
 import queue
+import itertools
 import os
 import shutil
 import tempfile
@@ -59,7 +62,20 @@ if PYTTSX3_AVAILABLE and not EDGE_TTS_AVAILABLE:
     _engine.setProperty('rate', 160)
     print("INFO: Motor pyttsx3 inicializado.")
 
-_speech_queue = queue.Queue()
+# Fila de fala com prioridade: (prioridade, ordem, turno, texto).
+# Cada pergunta do usuário abre um novo turno; falas de turnos antigos são
+# descartadas e a reprodução em andamento é interrompida (barge-in).
+PRIORIDADE_RESPOSTA = 0
+PRIORIDADE_SUGESTAO = 1
+
+_speech_queue = queue.PriorityQueue()
+_speech_seq = itertools.count()
+_turn_lock = threading.Lock()
+_current_turn = 0
+_current_proc = None  # processo do player em reprodução
+# captura de voz ativa (modo voz); fica pausada enquanto o agente fala para que
+# a própria resposta não seja reconhecida como uma nova pergunta
+_listener = None
 
 CACHE_DIR = "tts_cache"
 os.makedirs(CACHE_DIR, exist_ok=True)
@@ -68,7 +84,11 @@ def _cache_path_for_text(text: str) -> str:
     key = hashlib.sha1(text.encode("utf-8")).hexdigest()
     return os.path.join(CACHE_DIR, f"{key}.mp3")
 
-def _play_file_with_player(path: str):
+def _turno_obsoleto(turno) -> bool:
+    return turno is not None and turno < _current_turn
+
+def _play_file_with_player(path: str, turno: int = None):
+    global _current_proc
     if _player is None:
         # no player found, try default OS open
         try:
@@ -92,9 +112,18 @@ def _play_file_with_player(path: str):
 
     try:
         print(f"INFO: Executando comando de áudio: {' '.join(cmd)}")
-        subprocess.run(cmd, check=False, capture_output=True, text=True)
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with _turn_lock:
+            _current_proc = proc
+            obsoleto = _turno_obsoleto(turno)
+        if obsoleto:
+            proc.terminate()
+        proc.wait()
     except Exception as e:
         print(f"ERRO: Falha ao executar o reprodutor de áudio: {e}")
+    finally:
+        with _turn_lock:
+            _current_proc = None
 
 async def _edge_tts_save(text: str, path: str, voice: str = "pt-BR-FranciscaNeural"):
     communicate = edge_tts.Communicate(text, voice)
@@ -117,43 +146,58 @@ def _synthesize_with_edge(text: str) -> str:
             pass
         raise
 
+def _sintetizar_para_cache(texto: str):
+    """Gera o áudio do texto no cache do TTS, se ainda não existir."""
+    path = _cache_path_for_text(texto)
+    if os.path.exists(path):
+        return
+    mp3 = _synthesize_with_edge(texto)
+    # mover arquivo gerado para cache
+    try:
+        os.replace(mp3, path)
+    except Exception:
+        try:
+            os.remove(path)
+            os.replace(mp3, path)
+        except Exception:
+            pass
+
 # pré-sintetizar respostas conhecidas para reduzir latência
 if EDGE_TTS_AVAILABLE:
     for r in set(respostas):
-        path = _cache_path_for_text(r)
-        if not os.path.exists(path):
-            try:
-                mp3 = _synthesize_with_edge(r)
-                # mover arquivo gerado para cache
-                try:
-                    os.replace(mp3, path)
-                except Exception:
-                    try:
-                        os.remove(path)
-                        os.replace(mp3, path)
-                    except Exception:
-                        pass
-            except Exception as e:
-                print("Falha ao pré-sintetizar resposta:", e)
+        try:
+            _sintetizar_para_cache(r)
+        except Exception as e:
+            print("Falha ao pré-sintetizar resposta:", e)
+
+def _speak_with_engine(texto: str):
+    _engine.say(texto)
+    _engine.runAndWait()
 
 def _speech_worker():
     while True:
-        texto = _speech_queue.get()
+        _prioridade, _ordem, turno, texto = _speech_queue.get()
+        if _listener is not None:
+            _listener.pause()
         try:
+            if _turno_obsoleto(turno):
+                continue  # o usuário já fez outra pergunta
             cached = _cache_path_for_text(texto)
             if os.path.exists(cached):
-                _play_file_with_player(cached)
+                _play_file_with_player(cached, turno)
             else:
                 if EDGE_TTS_AVAILABLE:
                     try:
                         mp3_path = _synthesize_with_edge(texto)
-                        # mover para cache
+                        # mover para cache (mesmo que o turno tenha sido cancelado durante a síntese)
                         try:
                             os.replace(mp3_path, cached)
-                            _play_file_with_player(cached)
+                            if not _turno_obsoleto(turno):
+                                _play_file_with_player(cached, turno)
                         except Exception as e_replace:
                             print(f"AVISO: Falha ao mover áudio para o cache: {e_replace}")
-                            _play_file_with_player(mp3_path)
+                            if not _turno_obsoleto(turno):
+                                _play_file_with_player(mp3_path, turno)
                             try:
                                 os.remove(mp3_path)
                             except Exception:
@@ -162,45 +206,120 @@ def _speech_worker():
                         print(f"ERRO: Falha na síntese com edge-tts: {e}")
                         if _engine:
                             print("INFO: Tentando fallback para pyttsx3...")
-                            _engine.say(texto)
-                            _engine.runAndWait()
+                            _speak_with_engine(texto)
                         else:
                             print("ERRO TTS: Nenhum motor de fallback disponível.", e)
                 else:
                     if _engine:
                         print("INFO: Usando pyttsx3 para falar.")
-                        _engine.say(texto)
-                        _engine.runAndWait()
+                        _speak_with_engine(texto)
                     else:
                         print("Resposta (sem áudio):", texto)
         except Exception as e:
             print("Erro ao reproduzir áudio:", e)
-        _speech_queue.task_done()
+        finally:
+            _speech_queue.task_done()
+            if _listener is not None and _speech_queue.unfinished_tasks == 0:
+                _listener.resume()
 
 _thread = threading.Thread(target=_speech_worker, daemon=True)
 _thread.start()
 
-def falar(texto: str):
-    """Enfileira texto para reprodução assíncrona (retorna imediatamente)."""
-    _speech_queue.put(texto)
+def novo_turno() -> int:
+    """Inicia um novo turno de conversa: falas pendentes de turnos anteriores são
+    descartadas e a reprodução em andamento é interrompida."""
+    global _current_turn
+    with _turn_lock:
+        _current_turn += 1
+        turno = _current_turn
+        proc = _current_proc
+    if proc is not None and proc.poll() is None:
+        try:
+            proc.terminate()
+        except Exception:
+            pass
+    if _engine:
+        try:
+            _engine.stop()
+        except Exception:
+            pass
+    return turno
+
+def falar(texto: str, prioridade: int = PRIORIDADE_RESPOSTA, turno: int = None):
+    """Enfileira texto para reprodução assíncrona (retorna imediatamente).
+    Por padrão a fala pertence ao turno atual."""
+    if turno is None:
+        turno = _current_turn
+    if _listener is not None:
+        _listener.pause()
+    _speech_queue.put((prioridade, next(_speech_seq), turno, texto))
+
+# Modo de entrada: "texto" (teclado) ou "voz" (microfone com reconhecimento em fluxo)
+INPUT_MODE = os.environ.get("INPUT_MODE", "texto").lower()
+
+def _perguntas_digitadas():
+    while True:
+        yield input("Digite sua pergunta (ou 'sair' para encerrar): ")
+
+def _perguntas_faladas():
+    global _listener
+    # importado aqui para o modo texto não depender das bibliotecas de áudio
+    from services.get_audio import ouvir
+    print("INFO: Modo voz ativo. Diga sua pergunta (ou 'sair' para encerrar).")
+    # começa pausado se a mensagem de boas-vindas ainda estiver sendo falada
+    _listener = ouvir(wav_path=os.environ.get("INPUT_WAV"), paused=_speech_queue.unfinished_tasks > 0)
+    for texto in _listener:
+        print("Você disse:", texto)
+        yield texto
+
+# Pré-busca especulativa: responde as sugestões do LLM em segundo plano para que
+# a pergunta seguinte, se for uma delas, seja respondida na hora
+PREFETCH_ENABLED = os.environ.get("PREFETCH", "0").lower() in ("1", "true", "sim")
+PREFETCH_TTS = os.environ.get("PREFETCH_TTS", "0").lower() in ("1", "true", "sim")
+
+def _criar_prefetcher():
+    if not PREFETCH_ENABLED:
+        return None
+    from models.prefetch import Prefetcher
+    return Prefetcher(
+        max_workers=int(os.environ.get("PREFETCH_CONCURRENCY", "2")),
+        max_por_turno=int(os.environ.get("PREFETCH_MAX_PER_TURN", "3")),
+        orcamento=int(os.environ.get("PREFETCH_BUDGET", "30")),
+        sintetizar=_sintetizar_para_cache if PREFETCH_TTS and EDGE_TTS_AVAILABLE else None,
+    )
 
 def main():
+    # atualiza a base de QA em segundo plano (não bloqueia a inicialização)
+    start_background_refresh()
+    # recarrega modelo e índice RAG quando os arquivos mudam (sem reiniciar)
+    start_watching()
+    print(f"INFO: Versão dos artefatos ativa: {active_version()}")
+
     service_name = os.environ.get("SERVICE_NAME", "este projeto")
     mensagem_boas_vindas = f"Olá, no que posso ajudar sobre o {service_name}?"
     
     print(mensagem_boas_vindas)
     falar(mensagem_boas_vindas)
     
-    while True:
-        texto_usuario = input("Digite sua pergunta (ou 'sair' para encerrar): ")
-        
+    perguntas = _perguntas_faladas() if INPUT_MODE == "voz" else _perguntas_digitadas()
+    prefetcher = _criar_prefetcher()
+
+    for texto_usuario in perguntas:
         if texto_usuario.lower() in ["sair", "exit", "quit"]:
             print("Encerrando...")
             break
-        
-        resposta, sugestoes = responder(texto_usuario)
+
+        # nova pergunta: cancela o que ainda estava para ser falado do turno anterior
+        turno = novo_turno()
+
+        resultado = prefetcher.take(texto_usuario) if prefetcher else None
+        if resultado:
+            print("\n[INFO] Fonte da resposta: Pré-busca (sugestão respondida antecipadamente).")
+            resposta, sugestoes = resultado
+        else:
+            resposta, sugestoes = responder(texto_usuario)
         print("Resposta:", resposta)
-        falar(resposta)  # Fala apenas a resposta principal
+        falar(resposta, PRIORIDADE_RESPOSTA, turno)  # Fala apenas a resposta principal
 
         if sugestoes:
             print("\nSugestões para aprofundar:")
@@ -209,8 +328,15 @@ def main():
                 print(f"- {sug}")
                 sugestoes_texto += f" {i+1}: {sug}." # Constrói a frase para ser falada
             
-            falar(sugestoes_texto) # Enfileira as sugestões para serem faladas
+            falar(sugestoes_texto, PRIORIDADE_SUGESTAO, turno) # Enfileira as sugestões para serem faladas
             print() # Adiciona uma linha em branco para espaçamento
 
+            if prefetcher:
+                prefetcher.prefetch(sugestoes)
+
+    if prefetcher:
+        prefetcher.print_stats()
+        prefetcher.shutdown()
+
 if __name__ == "__main__":
     main()
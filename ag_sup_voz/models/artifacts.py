@@ -0,0 +1,281 @@
+"""
+Arquivo responsável por carregar, versionar e recarregar os artefatos do agente:
+o classificador Keras (modelo, tokenizer e respostas) e o índice RAG (FAISS),
+monolítico e/ou dividido em shards (um por repositório).
+
+Os artefatos de uma mesma versão ficam juntos em um `ArtifactBundle`. Quem
+atende uma pergunta pega o bundle atual uma única vez e o usa até o fim, então
+a troca por uma nova versão (feita em segundo plano quando os arquivos mudam)
+é atômica e não afeta requisições em andamento.
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+MODEL_PATH = "models/model.h5"
+TOKENIZER_PATH = "models/tokenizer.json"
+RESPOSTAS_PATH = "data/respostas.json"
+INDEX_PATH = "data/index.faiss"
+META_PATH = "data/meta.json"
+SHARDS_DIR = "data/shards"
+# nome do índice monolítico entre os shards carregados
+DEFAULT_SHARD = "default"
+
+CLASSIFIER_FILES = (MODEL_PATH, TOKENIZER_PATH, RESPOSTAS_PATH)
+RAG_FILES = (INDEX_PATH, META_PATH)
+
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_listeners = []
+_current = None
+_stop_event = threading.Event()
+_watcher = None
+
+
+class ArtifactBundle:
+    """Conjunto de artefatos carregados juntos. Não deve ser alterado após criado."""
+
+    def __init__(self, classifier_version, rag_version, model, tokenizer, respostas, rag_shards=None, rag_versions=None):
+        self.classifier_version = classifier_version
+        self.rag_version = rag_version
+        self.model = model
+        self.tokenizer = tokenizer
+        self.respostas = respostas
+        # {nome_do_shard: LoadedIndex}
+        self.rag_shards = rag_shards or {}
+        # {nome_do_shard: fingerprint dos arquivos}, para recarregar só o que mudou
+        self.rag_versions = rag_versions or {}
+
+    @property
+    def version(self) -> str:
+        return f"{self.classifier_version}.{self.rag_version}"
+
+    @property
+    def rag_enabled(self) -> bool:
+        return bool(self.rag_shards)
+
+
+def _fingerprint(paths) -> str:
+    """Identifica a versão de um grupo de arquivos (mtime + tamanho)."""
+    h = hashlib.sha1()
+    for p in paths:
+        try:
+            st = os.stat(p)
+            h.update(f"{p}:{st.st_mtime_ns}:{st.st_size};".encode("utf-8"))
+        except OSError:
+            h.update(f"{p}:-;".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def _load_classifier():
+    """Carrega modelo, tokenizer e respostas salvos.
+
+    Nunca treina durante o carregamento: se os artefatos não existirem, retorna
+    (None, None, []) e o agente segue sem a etapa do modelo de ML."""
+    if not all(os.path.exists(p) for p in CLASSIFIER_FILES):
+        print("[AVISO] Artefatos do modelo não encontrados. Execute 'python training/train.py' para gerá-los.")
+        return None, None, []
+
+    import tensorflow as tf
+    from tensorflow.keras.preprocessing.text import tokenizer_from_json
+
+    model = tf.keras.models.load_model(MODEL_PATH)
+    with open(TOKENIZER_PATH, "r", encoding="utf-8") as f:
+        tokenizer = tokenizer_from_json(f.read())
+    with open(RESPOSTAS_PATH, "r", encoding="utf-8") as f:
+        respostas = json.load(f)
+    # os arquivos são publicados um de cada vez: um modelo novo com respostas
+    # antigas levaria a IndexError em `responder()`
+    n_classes = model.output_shape[-1]
+    if n_classes != len(respostas):
+        raise ValueError(f"Artefatos inconsistentes: o modelo tem {n_classes} classes e {RESPOSTAS_PATH} tem {len(respostas)} respostas (treino em andamento?).")
+    return model, tokenizer, respostas
+
+
+def _shard_names() -> list:
+    """Shards completos em SHARDS_DIR (sem importar o FAISS)."""
+    if not os.path.isdir(SHARDS_DIR):
+        return []
+    return [
+        name for name in sorted(os.listdir(SHARDS_DIR))
+        if all(os.path.exists(os.path.join(SHARDS_DIR, name, f)) for f in ("index.faiss", "meta.json"))
+    ]
+
+
+def _rag_sources() -> dict:
+    """Índices disponíveis como {nome: (index_path, meta_path)}."""
+    sources = {}
+    if all(os.path.exists(p) for p in RAG_FILES):
+        sources[DEFAULT_SHARD] = RAG_FILES
+    for name in _shard_names():
+        sources[name] = (os.path.join(SHARDS_DIR, name, "index.faiss"), os.path.join(SHARDS_DIR, name, "meta.json"))
+    return sources
+
+
+def _rag_versions(sources: dict) -> dict:
+    """Fingerprint de cada índice: reindexar um repositório muda só o seu."""
+    return {name: _fingerprint(paths) for name, paths in sources.items()}
+
+
+def _rag_version(versions: dict) -> str:
+    h = hashlib.sha1()
+    for name in sorted(versions):
+        h.update(f"{name}:{versions[name]};".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def _load_rag(sources: dict, versions: dict, old=None) -> dict:
+    """Carrega os índices como {nome: LoadedIndex}, reaproveitando do bundle
+    `old` os que não mudaram (sem ler do disco nem duplicar na memória)."""
+    if not sources:
+        return {}
+    from rag.query import get_model, load_index_files
+
+    get_model()  # aquece o modelo de embeddings junto com o índice
+    shards = {}
+    for name, (index_path, meta_path) in sources.items():
+        if old is not None and name in old.rag_shards and old.rag_versions.get(name) == versions[name]:
+            shards[name] = old.rag_shards[name]
+        else:
+            shards[name] = _check_index(name, load_index_files(index_path, meta_path))
+    return shards
+
+
+def _check_index(name: str, entry):
+    """Garante que índice, metadados e vetores são da mesma indexação (o
+    index.faiss e o meta.json são trocados um após o outro)."""
+    n = entry.index.ntotal
+    if n != len(entry.metas):
+        raise ValueError(f"Índice '{name}' inconsistente: {n} vetores e {len(entry.metas)} metadados (indexação em andamento?).")
+    if entry.vectors is not None and len(entry.vectors) != n:
+        raise ValueError(f"Índice '{name}' inconsistente: {n} vetores no índice e {len(entry.vectors)} para re-ranking.")
+    return entry
+
+
+def _swap(bundle: ArtifactBundle):
+    global _current
+    with _lock:
+        _current = bundle
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback(bundle)
+        except Exception as e:
+            print(f"[AVISO] Falha ao notificar troca de artefatos: {e}")
+
+
+def reload_artifacts(force: bool = False, classifier: bool = True) -> ArtifactBundle:
+    """Carrega a versão atual dos arquivos e a torna ativa.
+
+    Só recarrega a parte que mudou (classificador ou, no RAG, cada índice/shard
+    alterado); o restante é reaproveitado do bundle ativo. Se nada mudou, retorna o bundle ativo sem recarregar.
+
+    Com `classifier=False` o modelo Keras não é carregado (o TensorFlow não é
+    inicializado); a próxima chamada sem esse argumento carrega só ele."""
+    with _reload_lock:
+        old = _current
+        classifier_version = _fingerprint(CLASSIFIER_FILES) if classifier else ""
+        rag_sources = _rag_sources()
+        rag_versions = _rag_versions(rag_sources)
+        rag_version = _rag_version(rag_versions)
+
+        if old is not None and not force and old.classifier_version == classifier_version and old.rag_version == rag_version:
+            return old
+
+        # Artefatos inconsistentes (gravação pela metade) levantam ValueError: numa
+        # recarga, a versão ativa é mantida; na primeira carga, a parte afetada
+        # fica desativada até a próxima mudança nos arquivos.
+        if not classifier:
+            model, tokenizer, respostas = None, None, []
+        elif old is not None and not force and old.classifier_version == classifier_version:
+            model, tokenizer, respostas = old.model, old.tokenizer, old.respostas
+        else:
+            try:
+                model, tokenizer, respostas = _load_classifier()
+            except ValueError as e:
+                if old is not None:
+                    raise
+                print(f"[AVISO] {e} Modelo de ML desativado até a próxima gravação.")
+                model, tokenizer, respostas = None, None, []
+
+        if old is not None and not force and old.rag_version == rag_version:
+            rag_shards = old.rag_shards
+        else:
+            try:
+                rag_shards = _load_rag(rag_sources, rag_versions, None if force else old)
+            except ValueError as e:
+                if old is not None:
+                    raise
+                print(f"[AVISO] {e} RAG desativado até a próxima gravação.")
+                rag_shards = {}
+
+        bundle = ArtifactBundle(classifier_version, rag_version, model, tokenizer, respostas, rag_shards, rag_versions)
+        _swap(bundle)
+        return bundle
+
+
+def current_artifacts() -> ArtifactBundle:
+    """Retorna o bundle ativo, carregando-o na primeira chamada."""
+    bundle = _current
+    if bundle is None:
+        bundle = reload_artifacts()
+    return bundle
+
+
+def active_version() -> str:
+    """Versão dos artefatos ativos no formato '<classificador>.<rag>'."""
+    return current_artifacts().version
+
+
+def add_listener(callback):
+    """Registra `callback(bundle)`, chamado sempre que uma nova versão entra em uso."""
+    with _lock:
+        _listeners.append(callback)
+
+
+def start_watching():
+    """Observa os arquivos de artefatos e recarrega em segundo plano quando mudam."""
+    global _watcher
+    if _watcher is not None and _watcher.is_alive():
+        return _watcher
+    try:
+        from watchfiles import watch
+    except ImportError:
+        print("[AVISO] watchfiles não instalado; recarga automática de artefatos desativada.")
+        return None
+
+    alvos = {os.path.abspath(p) for p in CLASSIFIER_FILES + RAG_FILES}
+    pastas = sorted({os.path.dirname(p) for p in alvos if os.path.isdir(os.path.dirname(p))})
+    if not pastas:
+        return None
+    shards_dir = os.path.abspath(SHARDS_DIR) + os.sep
+    _stop_event.clear()
+
+    def _relevante(_change, path):
+        path = os.path.abspath(path)
+        if path in alvos:
+            return True
+        return path.startswith(shards_dir) and os.path.basename(path) in ("index.faiss", "meta.json")
+
+    def _loop():
+        # a observação é recursiva, então shards novos em data/shards também são vistos
+        for _changes in watch(*pastas, stop_event=_stop_event, watch_filter=_relevante):
+            try:
+                bundle = reload_artifacts()
+                print(f"[INFO] Artefatos recarregados (versão {bundle.version}).")
+            except Exception as e:
+                # arquivos ainda sendo gravados: mantém a versão ativa e tenta de novo na próxima mudança
+                print(f"[AVISO] Falha ao recarregar artefatos, mantendo versão {_current.version if _current else '-'}: {e}")
+
+    _watcher = threading.Thread(target=_loop, name="artifacts-watch", daemon=True)
+    _watcher.start()
+    return _watcher
+
+
+def stop_watching(timeout: float = None):
+    """Interrompe a observação dos arquivos de artefatos."""
+    _stop_event.set()
+    if _watcher is not None:
+        _watcher.join(timeout)
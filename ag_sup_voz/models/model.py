@@ -4,22 +4,26 @@ o tokenizer e as respostas.
 """
 
 import os
-import json
 import re
 import numpy as np
 import sys
 
-from data.qa_data import qa_pairs
-from training.utils import criar_tokenizer, texto_para_sequencia
-from rag.query import query as rag_query
+from data.qa_data import qa_pairs, add_listener
+from training.utils import texto_para_sequencia
+from rag.query import search_shards as rag_search_shards
+from models.artifacts import current_artifacts, add_listener as add_artifacts_listener
 
 # Adicionando o diretório raiz do projeto ao sys.path para corrigir problemas de importação relativa após a modularização.
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # --- Configuração RAG e LLM ---
 LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "openai").lower()
-RAG_ENABLED = os.path.exists("data/index.faiss") and os.path.exists("data/meta.json")
 LLM_AVAILABLE = False
+# Restringe o RAG a alguns shards (nomes separados por vírgula); vazio = todos
+RAG_SHARDS = [s.strip() for s in os.environ.get("RAG_SHARDS", "").split(",") if s.strip()] or None
+# Restringe o RAG a algumas extensões (ex.: ".py,.md"), filtrando dentro do FAISS; vazio = todas
+RAG_EXTENSIONS = [e.strip() for e in os.environ.get("RAG_EXTENSIONS", "").split(",") if e.strip()]
+RAG_FILTERS = {"ext": RAG_EXTENSIONS} if RAG_EXTENSIONS else None
 
 # Configura o provedor de LLM selecionado
 try:
@@ -91,45 +95,21 @@ Esta funcionalidade permite que você crie um novo evento na plataforma, definin
 """
 
 
-# Tentar carregar artefatos salvos
-MODEL_PATH = "models/model.h5"
-TOKENIZER_PATH = "models/tokenizer.json"
-RESPOSTAS_PATH = "data/respostas.json"
+# Carregar artefatos (modelo, tokenizer, respostas e índice RAG) da versão ativa.
+# Os nomes abaixo são mantidos por compatibilidade e acompanham a versão ativa;
+# `responder()` usa sempre o bundle obtido no início de cada pergunta.
+_bundle = current_artifacts()
+model, tokenizer, respostas = _bundle.model, _bundle.tokenizer, _bundle.respostas
+RAG_ENABLED = _bundle.rag_enabled
 
-if os.path.exists(MODEL_PATH) and os.path.exists(TOKENIZER_PATH) and os.path.exists(RESPOSTAS_PATH):
-    import tensorflow as tf
-    from tensorflow.keras.preprocessing.text import tokenizer_from_json
 
-    model = tf.keras.models.load_model(MODEL_PATH)
+def _on_artifacts_update(bundle):
+    """Atualiza os nomes de compatibilidade quando uma nova versão entra em uso."""
+    global model, tokenizer, respostas, RAG_ENABLED
+    model, tokenizer, respostas = bundle.model, bundle.tokenizer, bundle.respostas
+    RAG_ENABLED = bundle.rag_enabled
 
-    with open(TOKENIZER_PATH, "r", encoding="utf-8") as f:
-        tokenizer = tokenizer_from_json(f.read())
-
-    with open(RESPOSTAS_PATH, "r", encoding="utf-8") as f:
-        respostas = json.load(f)
-
-    # preparar perguntas a partir do qa_pairs para mapa (mas respostas vem do arquivo)
-    perguntas = list(qa_pairs.keys())
-else:
-    # fallback: treinar rapidamente em tempo de import (quando artefatos não existirem)
-    import tensorflow as tf
-    tokenizer = criar_tokenizer(qa_pairs)
-    perguntas = list(qa_pairs.keys())
-    respostas = list(qa_pairs.values())
-    X = np.array([texto_para_sequencia(tokenizer, p)[0] for p in perguntas])
-    y = np.arange(len(respostas))
-
-    model = tf.keras.Sequential([
-        tf.keras.layers.Embedding(input_dim=len(tokenizer.word_index)+1, output_dim=8, input_length=10),
-        tf.keras.layers.GlobalAveragePooling1D(),
-        tf.keras.layers.Dense(16, activation='relu'),
-        tf.keras.layers.Dense(len(respostas), activation='softmax')
-    ])
-
-    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
-    model.fit(X, y, epochs=200, verbose=0)
-
-    respostas = list(qa_pairs.values())
+add_artifacts_listener(_on_artifacts_update)
 
 # Criar mapa de perguntas normalizadas para correspondência rápida
 def _normalize(texto: str):
@@ -141,6 +121,17 @@ def _normalize(texto: str):
 _norm_qa_map = { _normalize(k): v for k, v in qa_pairs.items() }
 
 
+def _on_qa_update(novos_pares: dict):
+    """Troca `qa_pairs` e o mapa normalizado quando a base de QA é atualizada
+    em segundo plano (sem reiniciar o agente)."""
+    global qa_pairs, _norm_qa_map
+    _norm_qa_map = { _normalize(k): v for k, v in novos_pares.items() }
+    qa_pairs = novos_pares
+    print(f"[INFO] Base de QA atualizada ({len(novos_pares)} pares).")
+
+add_listener(_on_qa_update)
+
+
 def _summarize_chunks_fallback(chunks: list) -> str:
     """
     Cria um resumo estruturado e mais natural a partir dos chunks encontrados,
@@ -179,10 +170,13 @@ def _summarize_chunks_fallback(chunks: list) -> str:
     return "Não consegui consultar o modelo de linguagem, mas com base nos arquivos, posso te adiantar o seguinte:\n\n" + final_summary
 
 
-def responder_com_rag(pergunta: str, k: int = 3):
-    """Busca no índice vetorial e retorna uma tupla (resposta, sugestões)."""
+def responder_com_rag(pergunta: str, k: int = 3, bundle=None, shards=None, filters=None):
+    """Busca no índice vetorial e retorna uma tupla (resposta, sugestões).
+    `shards` restringe a busca a alguns repositórios (padrão: RAG_SHARDS) e
+    `filters` por caminho/extensão/tipo de chunk (padrão: RAG_FILTERS)."""
+    bundle = bundle or current_artifacts()
     print("\n[INFO] Buscando na base de código (RAG)...")
-    chunks = rag_query(pergunta, k=k)
+    chunks = rag_search_shards(bundle.rag_shards, pergunta, k=k, only=shards or RAG_SHARDS, filters=filters or RAG_FILTERS)
     
     if not chunks:
         print("[INFO] Nenhum contexto relevante encontrado no RAG.")
@@ -242,30 +236,33 @@ def responder_com_rag(pergunta: str, k: int = 3):
 def responder(texto_usuario):
     """Função principal para obter uma tupla (resposta, sugestões)."""
     texto_norm = _normalize(texto_usuario)
+    # a pergunta inteira é respondida com a mesma versão dos artefatos
+    bundle = current_artifacts()
 
     # 1. Correspondência direta
     if texto_norm in _norm_qa_map:
         print("\n[INFO] Fonte da resposta: Correspondência Direta (qa_data).")
         return _norm_qa_map[texto_norm], []
 
-    # 2. Modelo de ML
-    print("\n[INFO] Fonte da resposta: Modelo de ML.")
-    seq = texto_para_sequencia(tokenizer, texto_usuario)
-    pred = model.predict(seq, verbose=0)
-    idx = np.argmax(pred)
-    prob = np.max(pred)
+    # 2. Modelo de ML (se os artefatos tiverem sido treinados)
+    if bundle.model is not None:
+        print("\n[INFO] Fonte da resposta: Modelo de ML.")
+        seq = texto_para_sequencia(bundle.tokenizer, texto_usuario)
+        pred = bundle.model.predict(seq, verbose=0)
+        idx = np.argmax(pred)
+        prob = np.max(pred)
 
-    CONFIDENCE_THRESHOLD = 0.75  # Limite de confiança
+        CONFIDENCE_THRESHOLD = 0.75  # Limite de confiança
 
-    if prob > CONFIDENCE_THRESHOLD:
-        print(f"[INFO] Confiança do modelo: {prob:.2f} (acima do limite de {CONFIDENCE_THRESHOLD})")
-        return respostas[idx], []
-    
-    print(f"[INFO] Confiança do modelo: {prob:.2f} (abaixo do limite de {CONFIDENCE_THRESHOLD})")
+        if prob > CONFIDENCE_THRESHOLD:
+            print(f"[INFO] Confiança do modelo: {prob:.2f} (acima do limite de {CONFIDENCE_THRESHOLD})")
+            return bundle.respostas[idx], []
+
+        print(f"[INFO] Confiança do modelo: {prob:.2f} (abaixo do limite de {CONFIDENCE_THRESHOLD})")
 
     # 3. Fallback para RAG se o índice existir
-    if RAG_ENABLED:
-        rag_result = responder_com_rag(texto_usuario)
+    if bundle.rag_enabled:
+        rag_result = responder_com_rag(texto_usuario, bundle=bundle)
         if rag_result:
             return rag_result  # Propaga a tupla (resposta, sugestões)
 
@@ -0,0 +1,126 @@
+"""
+Arquivo com a pré-busca especulativa das respostas às sugestões do LLM.
+
+Depois de cada resposta, as perguntas sugeridas ("SUGESTÕES:") são respondidas
+em segundo plano (busca + LLM e, opcionalmente, o áudio do TTS). Se o usuário
+fizer em seguida uma delas, a resposta já está pronta. A pré-busca tem limite
+de concorrência, de perguntas por turno e um orçamento total de respostas
+especulativas por sessão.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from models.model import responder, _normalize
+from models.artifacts import active_version
+
+
+class Prefetcher:
+    """Responde as sugestões em segundo plano e guarda os resultados por
+    pergunta normalizada.
+
+    - `max_workers`: respostas especulativas geradas ao mesmo tempo.
+    - `max_por_turno`: quantas sugestões de cada resposta são pré-buscadas.
+    - `orcamento`: total de respostas especulativas na sessão (0 = sem limite).
+    - `sintetizar`: função opcional chamada com o texto da resposta pronta
+      (ex.: gerar o áudio no cache do TTS).
+    """
+
+    def __init__(self, max_workers: int = 2, max_por_turno: int = 3, orcamento: int = 30, ttl: float = 600.0, max_entradas: int = 32, sintetizar=None):
+        self.max_por_turno = max_por_turno
+        self.orcamento = orcamento
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.sintetizar = sintetizar
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        # pergunta normalizada -> (future, versão dos artefatos, instante)
+        self._entradas = OrderedDict()
+        self.stats = {"perguntas": 0, "acertos": 0, "iniciadas": 0, "geradas": 0, "canceladas": 0, "erros": 0}
+
+    def _gerar(self, pergunta: str):
+        with self._lock:
+            if self.orcamento and self.stats["iniciadas"] >= self.orcamento:
+                return None
+            self.stats["iniciadas"] += 1
+        try:
+            resposta, sugestoes = responder(pergunta)
+            if self.sintetizar:
+                try:
+                    self.sintetizar(resposta)
+                except Exception as e:
+                    print(f"[AVISO] Pré-busca: falha ao sintetizar áudio: {e}")
+        except Exception as e:
+            with self._lock:
+                self.stats["erros"] += 1
+            print(f"[AVISO] Pré-busca falhou para '{pergunta}': {e}")
+            return None
+        with self._lock:
+            self.stats["geradas"] += 1
+        return resposta, sugestoes
+
+    def prefetch(self, sugestoes: list):
+        """Agenda a resposta especulativa das sugestões (retorna imediatamente)."""
+        versao = active_version()
+        agora = time.monotonic()
+        with self._lock:
+            for sugestao in sugestoes[:self.max_por_turno]:
+                chave = _normalize(sugestao)
+                if not chave:
+                    continue
+                entrada = self._entradas.get(chave)
+                if entrada and entrada[1] == versao and agora - entrada[2] < self.ttl:
+                    self._entradas.move_to_end(chave)
+                    continue
+                self._entradas[chave] = (self._executor.submit(self._gerar, sugestao), versao, agora)
+                self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                _, (fut, _, _) = self._entradas.popitem(last=False)
+                if fut.cancel():
+                    self.stats["canceladas"] += 1
+
+    def take(self, pergunta: str):
+        """Retorna (resposta, sugestões) pré-buscada para a pergunta, ou None.
+
+        Chamado a cada nova pergunta: respostas especulativas que ainda nem
+        começaram são canceladas, já que o usuário seguiu a conversa."""
+        chave = _normalize(pergunta)
+        with self._lock:
+            self.stats["perguntas"] += 1
+            entrada = self._entradas.pop(chave, None)
+            for fut, _, _ in self._entradas.values():
+                if fut.cancel():
+                    self.stats["canceladas"] += 1
+            self._entradas = OrderedDict((k, v) for k, v in self._entradas.items() if not v[0].cancelled())
+
+        if entrada is None:
+            return None
+        fut, versao, instante = entrada
+        if versao != active_version() or time.monotonic() - instante >= self.ttl:
+            return None
+        if fut.cancel():
+            # ainda na fila: responder agora é mais rápido que esperar a vez
+            with self._lock:
+                self.stats["canceladas"] += 1
+            return None
+        # já pronta ou em andamento: esperar é no máximo tão lento quanto recomeçar
+        resultado = fut.result()
+        if resultado is not None:
+            with self._lock:
+                self.stats["acertos"] += 1
+        return resultado
+
+    def hit_rate(self) -> float:
+        return self.stats["acertos"] / self.stats["perguntas"] if self.stats["perguntas"] else 0.0
+
+    def print_stats(self):
+        s = self.stats
+        aproveitamento = s["acertos"] / s["geradas"] if s["geradas"] else 0.0
+        print(f"[INFO] Pré-busca: {s['acertos']} acertos em {s['perguntas']} perguntas ({self.hit_rate():.0%}); "
+              f"{s['geradas']} respostas especulativas geradas ({aproveitamento:.0%} aproveitadas), "
+              f"{s['canceladas']} canceladas, {s['erros']} com erro")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,94 @@
+"""
+Arquivo para eliminar chunks quase duplicados na indexação (MinHash + LSH).
+
+Arquivos copiados, código vendorizado, arquivos gerados e a sobreposição do
+chunking por palavras produzem muitos chunks quase iguais. Cada chunk vira uma
+assinatura MinHash dos seus shingles (sequências de palavras); o LSH por bandas
+agrupa candidatos e só pares com similaridade de Jaccard estimada acima do
+limite são unidos. Apenas um representante por grupo é indexado.
+"""
+
+import zlib
+
+import numpy as np
+
+# primo maior que 2**32: com a < 2**31 e x < 2**32, a*x + b cabe em uint64
+_PRIME = np.uint64(4294967311)
+
+
+def _shingles(text: str, size: int = 5) -> np.ndarray:
+    words = text.lower().split()
+    if len(words) <= size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHasher:
+    """Gera assinaturas MinHash com `num_perm` funções (a*x + b) mod p."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        return ((np.outer(shingles, self.a) + self.b) % _PRIME).min(axis=0)
+
+
+def find_near_duplicates(texts: list, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 5) -> list:
+    """Para cada texto, retorna o índice do representante do seu grupo (o
+    primeiro texto do grupo; o próprio índice se não tiver duplicatas)."""
+    n = len(texts)
+    if n == 0:
+        return []
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+    sigs = np.vstack([hasher.signature(_shingles(t, shingle_size)) for t in texts])
+
+    parent = list(range(n))
+
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        block = sigs[:, band * rows:(band + 1) * rows]
+        buckets = {}
+        for i in range(n):
+            membros = buckets.setdefault(block[i].tobytes(), [])
+            ri = _find(i)
+            for j in membros:
+                rj = _find(j)
+                if rj == ri:
+                    break
+                # confirma o candidato pela similaridade estimada da assinatura inteira
+                if (sigs[i] == sigs[j]).mean() >= threshold:
+                    parent[max(ri, rj)] = min(ri, rj)
+                    break
+            membros.append(i)
+
+    return [_find(i) for i in range(n)]
+
+
+def dedup_chunks(metas: list, texts: list, threshold: float = 0.8):
+    """Mantém um chunk por grupo de quase duplicados. Os caminhos dos chunks
+    removidos vão para 'aliases' no metadado do representante.
+    Retorna (metas, texts, removidos)."""
+    reps = find_near_duplicates(texts, threshold=threshold)
+    keep = []
+    for i, r in enumerate(reps):
+        if r == i:
+            keep.append(i)
+            continue
+        path = metas[i]["path"]
+        aliases = metas[r].setdefault("aliases", [])
+        if path != metas[r]["path"] and path not in aliases:
+            aliases.append(path)
+    for i in keep:
+        if not metas[i].get("aliases"):
+            metas[i].pop("aliases", None)
+    return [metas[i] for i in keep], [texts[i] for i in keep], len(texts) - len(keep)
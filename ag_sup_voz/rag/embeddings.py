@@ -0,0 +1,225 @@
+"""
+Arquivo com os backends de embeddings usados na indexação e na consulta.
+
+- "torch" (padrão): SentenceTransformer sobre PyTorch.
+- "onnx" / "onnx-int8": o mesmo modelo exportado para ONNX e executado com
+  ONNX Runtime na CPU (sem importar PyTorch), opcionalmente quantizado em int8.
+
+Escolha com EMBEDDING_BACKEND (e ONNX_MODEL_DIR para a pasta exportada).
+
+Uso:
+    python rag/embeddings.py export [--quantize]     # converte o modelo do cache local
+    python rag/embeddings.py verify [--backend onnx-int8] [--texts data/meta.json]
+"""
+
+import os
+import json
+import time
+import inspect
+
+import numpy as np
+
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_ONNX_DIR = "models/onnx"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+# Similaridade de cosseno mínima entre os vetores ONNX e os do PyTorch
+TOLERANCE = {"onnx": 0.9999, "onnx-int8": 0.98}
+
+
+class OnnxEmbedder:
+    """Gera embeddings com ONNX Runtime, compatível com `SentenceTransformer.encode`."""
+
+    def __init__(self, model_dir: str = DEFAULT_ONNX_DIR, quantized: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "embedder.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        onnx_path = os.path.join(model_dir, _ONNX_FILES["onnx-int8" if quantized else "onnx"])
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"{onnx_path} não encontrado. Rode 'python rag/embeddings.py export{' --quantize' if quantized else ''}'.")
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(onnx_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        pad = self.config["pad_token"]
+        self._tokenizer.enable_padding(pad_id=self._tokenizer.token_to_id(pad), pad_token=pad)
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        enc = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in enc], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        # mean pooling, como no módulo Pooling do sentence-transformers
+        m = mask[:, :, None].astype(np.float32)
+        emb = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        if self.config.get("normalize"):
+            emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+        return emb.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.config.get("dim", 0)), dtype=np.float32)
+        # ordena por tamanho para reduzir padding dentro de cada lote
+        order = np.argsort([len(t) for t in texts])
+        out = np.empty((len(texts), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            out[idx] = self._encode_batch([texts[i] for i in idx])
+        return out[0] if single else out
+
+
+def load_embedder(model_name: str = DEFAULT_MODEL, backend: str = None, onnx_dir: str = None):
+    """Carrega o backend de embeddings configurado (EMBEDDING_BACKEND)."""
+    backend = (backend or os.environ.get("EMBEDDING_BACKEND", "torch")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de embeddings desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+    return OnnxEmbedder(onnx_dir or os.environ.get("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR), quantized=backend == "onnx-int8")
+
+
+def export_onnx(model_name: str = DEFAULT_MODEL, out_dir: str = DEFAULT_ONNX_DIR, quantize: bool = False, opset: int = 17):
+    """Exporta o modelo (do cache local do Hugging Face) para ONNX."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    st = SentenceTransformer(model_name, device="cpu", local_files_only=True)
+    pooling = next((m for m in st if isinstance(m, Pooling)), None)
+    # as versões antigas do sentence-transformers só têm get_pooling_mode_str()
+    modo = getattr(pooling, "pooling_mode", None) or (pooling.get_pooling_mode_str() if pooling is not None else None)
+    if modo != "mean":
+        raise ValueError("Apenas modelos com mean pooling são suportados na exportação ONNX.")
+    transformer = st[0]
+    hf_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    dummy = tokenizer(["exemplo de texto para exportação"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+    os.makedirs(out_dir, exist_ok=True)
+    onnx_path = os.path.join(out_dir, _ONNX_FILES["onnx"])
+    axes = {n: {0: "batch", 1: "seq"} for n in input_names + ["last_hidden_state"]}
+    # a partir do PyTorch 2.9 o padrão é o exportador dynamo (exige onnxscript),
+    # que não usa dynamic_axes; fica o exportador TorchScript
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHidden(hf_model),
+            tuple(dummy[n] for n in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=opset,
+            **extra,
+        )
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "embedder.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "dim": st.get_sentence_embedding_dimension(),
+            "max_seq_length": st.max_seq_length,
+            "pad_token": tokenizer.pad_token,
+            "normalize": any(isinstance(m, Normalize) for m in st),
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Modelo exportado: {onnx_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(out_dir, _ONNX_FILES["onnx-int8"])
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Modelo quantizado (int8): {int8_path}")
+
+
+def _load_texts(path: str = None, limit: int = 256) -> list:
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [d["text"] if isinstance(d, dict) else str(d) for d in data][:limit]
+    return [
+        "Como faço para criar um novo evento?",
+        "Onde vejo a lista de inscritos no meu evento?",
+        "def build_index(root_dir, index_path, meta_path): lê arquivos e gera embeddings",
+        "How do I reset my password on the login screen?",
+        "Configurações do agente de IA e variáveis de ambiente.",
+    ] * 20
+
+
+def verify(model_name: str = DEFAULT_MODEL, backend: str = "onnx", onnx_dir: str = DEFAULT_ONNX_DIR, texts: list = None, batch_size: int = 32) -> bool:
+    """Compara os vetores do backend ONNX com os do PyTorch e mede a velocidade.
+    Retorna True se a similaridade mínima estiver dentro da tolerância."""
+    texts = texts or _load_texts()
+    ref_model = load_embedder(model_name, "torch")
+    onnx_model = load_embedder(model_name, backend, onnx_dir)
+
+    def _timed(model):
+        model.encode(texts[:batch_size], batch_size=batch_size)  # aquecimento
+        inicio = time.perf_counter()
+        emb = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(emb, dtype=np.float32), time.perf_counter() - inicio
+
+    ref, t_ref = _timed(ref_model)
+    got, t_onnx = _timed(onnx_model)
+    cos = (ref * got).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(got, axis=1))
+
+    single = [("torch", ref_model), (backend, onnx_model)]
+    per_query = {}
+    for name, model in single:
+        model.encode(texts[0])
+        inicio = time.perf_counter()
+        for t in texts[:50]:
+            model.encode(t)
+        per_query[name] = (time.perf_counter() - inicio) * 1000 / min(50, len(texts))
+
+    ok = float(cos.min()) >= TOLERANCE[backend]
+    print(f"{len(texts)} textos | cosseno mín={cos.min():.6f} médio={cos.mean():.6f} (tolerância {TOLERANCE[backend]}) -> {'OK' if ok else 'FALHOU'}")
+    print(f"lote:     torch {t_ref:.2f}s | {backend} {t_onnx:.2f}s | speedup {t_ref / t_onnx:.2f}x")
+    print(f"consulta: torch {per_query['torch']:.1f}ms | {backend} {per_query[backend]:.1f}ms | speedup {per_query['torch'] / per_query[backend]:.2f}x")
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="cmd", required=True)
+    pe = sub.add_parser("export", help="exporta o modelo do cache local para ONNX")
+    pe.add_argument("--model", default=DEFAULT_MODEL)
+    pe.add_argument("--out", default=DEFAULT_ONNX_DIR)
+    pe.add_argument("--quantize", action="store_true", help="também gera a versão int8")
+    pv = sub.add_parser("verify", help="compara vetores e velocidade com o PyTorch")
+    pv.add_argument("--model", default=DEFAULT_MODEL)
+    pv.add_argument("--dir", default=DEFAULT_ONNX_DIR)
+    pv.add_argument("--backend", choices=BACKENDS[1:], default="onnx")
+    pv.add_argument("--texts", default=None, help="meta.json de um índice para usar como textos")
+    args = p.parse_args()
+
+    if args.cmd == "export":
+        export_onnx(args.model, args.out, quantize=args.quantize)
+    else:
+        sys.exit(0 if verify(args.model, args.backend, args.dir, _load_texts(args.texts)) else 1)
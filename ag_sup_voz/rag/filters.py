@@ -0,0 +1,218 @@
+"""
+Arquivo com os atributos de cada chunk (caminho, extensão e tipo) guardados em
+formato colunar compacto, ao lado do índice. Os filtros são aplicados dentro da
+busca do FAISS (IDSelector), então uma consulta filtrada custa quase o mesmo
+que uma sem filtro, sem precisar buscar muito mais que k resultados.
+
+Filtros aceitos (cada valor pode ser uma string ou uma lista):
+    {"ext": [".py", ".md"], "kind": "function", "path_prefix": "src/telas/",
+     "exclude_path_prefix": "config/"}
+
+Um chunk deduplicado também vale pelos caminhos das suas cópias ('aliases'):
+ele passa em `ext`/`path_prefix` se algum dos caminhos passar, e só é excluído
+por `exclude_path_prefix` se todos os caminhos forem excluídos.
+"""
+
+import os
+import bisect
+
+import numpy as np
+import faiss
+
+KINDS = ("class", "function", "module", "section", "text")
+
+
+def attrs_path_for(index_path: str) -> str:
+    """Caminho do arquivo de atributos de um índice (index.faiss -> index.attrs.npz)."""
+    return os.path.splitext(index_path)[0] + ".attrs.npz"
+
+
+def chunk_kind(path: str, text: str) -> str:
+    """Classifica um chunk pelo tipo de arquivo e pelo início do texto. Na
+    indexação, chunks Python recebem o tipo do nó da AST (`rag.index.chunk_with_kinds`);
+    esta função é o fallback para os demais arquivos."""
+    if path.endswith(".py"):
+        inicio = text.lstrip()
+        if inicio.startswith("class "):
+            return "class"
+        if inicio.startswith(("def ", "async def ", "@")):
+            return "function"
+        return "module"
+    if path.endswith(".md"):
+        return "section"
+    return "text"
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def _norm_ext(ext: str) -> str:
+    ext = ext.lower()
+    return ext if ext.startswith(".") else "." + ext
+
+
+class ChunkAttributes:
+    """Atributos por chunk em colunas numpy: ids de caminho (caminhos únicos em
+    ordem alfabética, então um prefixo vira um intervalo de ids), de extensão e
+    de tipo. Os aliases ficam em colunas à parte: um par (chunk, caminho) por
+    cópia removida na deduplicação."""
+
+    def __init__(self, paths, path_ids, exts, ext_ids, kinds, kind_ids, alias_chunks=(), alias_path_ids=(), alias_ext_ids=()):
+        self.paths = list(paths)
+        self.path_ids = np.asarray(path_ids, dtype=np.uint32)
+        self.exts = list(exts)
+        self.ext_ids = np.asarray(ext_ids, dtype=np.uint16)
+        self.kinds = list(kinds)
+        self.kind_ids = np.asarray(kind_ids, dtype=np.uint8)
+        self.alias_chunks = np.asarray(alias_chunks, dtype=np.uint32)
+        self.alias_path_ids = np.asarray(alias_path_ids, dtype=np.uint32)
+        self.alias_ext_ids = np.asarray(alias_ext_ids, dtype=np.uint16)
+        self._selectors = {}
+
+    def __len__(self):
+        return len(self.path_ids)
+
+    @classmethod
+    def from_metas(cls, metas: list) -> "ChunkAttributes":
+        caminhos = [m["path"].replace("\\", "/") for m in metas]
+        extensoes = [os.path.splitext(p)[1].lower() for p in caminhos]
+        tipos = [m.get("kind") or chunk_kind(m["path"], m.get("text", "")) for m in metas]
+        aliases = [(i, a.replace("\\", "/")) for i, m in enumerate(metas) for a in m.get("aliases", ())]
+        alias_exts = [os.path.splitext(a)[1].lower() for _, a in aliases]
+
+        paths = sorted(set(caminhos) | {a for _, a in aliases})
+        exts = sorted(set(extensoes) | set(alias_exts))
+        kinds = sorted(set(tipos))
+        path_pos = {p: i for i, p in enumerate(paths)}
+        ext_pos = {e: i for i, e in enumerate(exts)}
+        kind_pos = {k: i for i, k in enumerate(kinds)}
+        return cls(
+            paths,
+            [path_pos[p] for p in caminhos],
+            exts,
+            [ext_pos[e] for e in extensoes],
+            kinds,
+            [kind_pos[k] for k in tipos],
+            [i for i, _ in aliases],
+            [path_pos[a] for _, a in aliases],
+            [ext_pos[e] for e in alias_exts],
+        )
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f,
+                paths=np.array(self.paths, dtype=str),
+                path_ids=self.path_ids,
+                exts=np.array(self.exts, dtype=str),
+                ext_ids=self.ext_ids,
+                kinds=np.array(self.kinds, dtype=str),
+                kind_ids=self.kind_ids,
+                alias_chunks=self.alias_chunks,
+                alias_path_ids=self.alias_path_ids,
+                alias_ext_ids=self.alias_ext_ids,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkAttributes":
+        with np.load(path, allow_pickle=False) as data:
+            # arquivos gravados antes dos aliases não têm essas colunas
+            aliases = [data[k] for k in ("alias_chunks", "alias_path_ids", "alias_ext_ids") if k in data.files]
+            return cls(
+                data["paths"].tolist(),
+                data["path_ids"],
+                data["exts"].tolist(),
+                data["ext_ids"],
+                data["kinds"].tolist(),
+                data["kind_ids"],
+                *aliases,
+            )
+
+    def _por_chunk(self, own: np.ndarray, alias: np.ndarray, todos: bool = False) -> np.ndarray:
+        """Combina o teste do caminho do chunk com o dos aliases: basta um caminho
+        passar, ou, com `todos`, precisam passar todos."""
+        mask = own.copy()
+        if len(self.alias_chunks):
+            if todos:
+                mask[self.alias_chunks[~alias]] = False
+            else:
+                mask[self.alias_chunks[alias]] = True
+        return mask
+
+    def _prefix_mask(self, prefixes, todos: bool = False) -> np.ndarray:
+        own = np.zeros(len(self), dtype=bool)
+        alias = np.zeros(len(self.alias_chunks), dtype=bool)
+        for prefix in prefixes:
+            prefix = prefix.replace("\\", "/")
+            if not prefix:
+                own[:] = True
+                alias[:] = True
+                continue
+            lo = bisect.bisect_left(self.paths, prefix)
+            hi = bisect.bisect_left(self.paths, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+            if hi > lo:
+                own |= (self.path_ids >= lo) & (self.path_ids < hi)
+                alias |= (self.alias_path_ids >= lo) & (self.alias_path_ids < hi)
+        return self._por_chunk(own, alias, todos)
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """Máscara booleana dos chunks que atendem a todos os filtros."""
+        mask = np.ones(len(self), dtype=bool)
+        exts = _as_list(filters.get("ext"))
+        if exts is not None:
+            codes = [self.exts.index(e) for e in map(_norm_ext, exts) if e in self.exts]
+            mask &= self._por_chunk(np.isin(self.ext_ids, codes), np.isin(self.alias_ext_ids, codes))
+        kinds = _as_list(filters.get("kind"))
+        if kinds is not None:
+            codes = [self.kinds.index(k) for k in kinds if k in self.kinds]
+            mask &= np.isin(self.kind_ids, codes)
+        prefixes = _as_list(filters.get("path_prefix"))
+        if prefixes is not None:
+            mask &= self._prefix_mask(prefixes)
+        excluded = _as_list(filters.get("exclude_path_prefix"))
+        if excluded is not None:
+            mask &= ~self._prefix_mask(excluded, todos=True)
+        return mask
+
+    def search_params(self, filters: dict):
+        """Parâmetros de busca do FAISS com um IDSelectorBitmap para os filtros.
+        Retorna None se nenhum chunk passar no filtro. Os seletores ficam em cache."""
+        key = repr(sorted((k, _as_list(v)) for k, v in filters.items()))
+        cached = self._selectors.get(key)
+        if cached is None:
+            mask = self.mask(filters)
+            if not mask.any():
+                cached = (None, None, None)
+            else:
+                bitmap = np.packbits(mask, bitorder="little")
+                selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+                params = faiss.SearchParameters()
+                params.sel = selector
+                # o bitmap e o seletor precisam continuar vivos enquanto params for usado
+                cached = (params, selector, bitmap)
+            if len(self._selectors) >= 64:
+                self._selectors.clear()
+            self._selectors[key] = cached
+        return cached[0]
+
+
+def load_attributes(index_path: str, metas: list) -> ChunkAttributes:
+    """Lê os atributos gravados com o índice; para índices antigos, calcula a
+    partir dos metadados."""
+    path = attrs_path_for(index_path)
+    if os.path.exists(path):
+        try:
+            attrs = ChunkAttributes.load(path)
+            sem_aliases = not len(attrs.alias_chunks) and any(m.get("aliases") for m in metas)
+            if len(attrs) == len(metas) and not sem_aliases:
+                return attrs
+        except Exception:
+            pass
+    return ChunkAttributes.from_metas(metas)
@@ -4,16 +4,24 @@ Cria um índice de similaridade para recuperação de informações.
 """
 
 from pathlib import Path
+import os
 import json
 from typing import List
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import faiss
 import ast
-import inspect
 import re
+import sys
 
-DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.dedup import dedup_chunks
+from rag.embeddings import BACKENDS, DEFAULT_MODEL, load_embedder
+from rag.filters import ChunkAttributes, attrs_path_for, chunk_kind
+from rag.quantization import PRECISIONS, build_index_with_precision, save_vectors, vectors_path_for
+
+# Um shard por repositório: data/shards/<nome>/index.faiss + meta.json
+DEFAULT_SHARDS_DIR = "data/shards"
 
 
 def read_text_files(root: str, exts=(".py", ".md", ".txt", ".rst", ".json"), exclude_dirs=("venv", ".venv", ".venv_rag", "env", ".git", "node_modules", "__pycache__")) -> List[dict]:
@@ -31,29 +39,51 @@ def read_text_files(root: str, exts=(".py", ".md", ".txt", ".rst", ".json"), exc
     return docs
 
 
+def _python_chunks(text: str) -> List[tuple]:
+    """Chunks de um arquivo Python como (texto, tipo): cada classe e função
+    (incluindo métodos e decoradores) e o restante do código do módulo
+    (imports, constantes, docstring)."""
+    tree = ast.parse(text)
+    lines = text.splitlines()
+    chunks = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+            segment = "\n".join(lines[start - 1:node.end_lineno])
+            chunks.append((segment, "class" if isinstance(node, ast.ClassDef) else "function"))
+
+    # linhas fora das definições de nível superior formam o chunk do módulo
+    cobertas = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+            cobertas.update(range(start, node.end_lineno + 1))
+    resto = "\n".join(l for i, l in enumerate(lines, 1) if i not in cobertas).strip()
+    if resto:
+        chunks.insert(0, (resto, "module"))
+    return chunks
+
+
+def chunk_with_kinds(file_path: str, text: str) -> List[tuple]:
+    """Como `chunk_code_intelligently`, mas retorna (texto, tipo) de cada chunk.
+    Em Python o tipo vem do nó da AST (class/function/module)."""
+    if file_path.endswith(".py"):
+        try:
+            chunks = _python_chunks(text)
+            return chunks or [(text, "module")]
+        except SyntaxError:
+            return [(text, "module")]  # Retorna o arquivo inteiro se houver erro de sintaxe
+    return [(c, chunk_kind(file_path, c)) for c in chunk_code_intelligently(file_path, text)]
+
+
 def chunk_code_intelligently(file_path: str, text: str) -> List[str]:
     """
     Cria chunks de forma inteligente com base no tipo de arquivo.
-    - Para Python: extrai funções e classes.
+    - Para Python: extrai funções e classes (e o restante do módulo).
     - Para Markdown: divide por seções.
     """
     if file_path.endswith(".py"):
-        chunks = []
-        try:
-            tree = ast.parse(text)
-            for node in ast.walk(tree):
-                if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
-                    try:
-                        source_segment = inspect.getsource(node)
-                        chunks.append(source_segment)
-                    except (TypeError, OSError):
-                        # Fallback para nós que não podem ter o source extraído
-                        continue
-            if not chunks: # Se não encontrou funções/classes, usa o texto todo
-                chunks.append(text)
-            return chunks
-        except SyntaxError:
-            return [text] # Retorna o arquivo inteiro se houver erro de sintaxe
+        return [c for c, _ in chunk_with_kinds(file_path, text)]
 
     elif file_path.endswith(".md"):
         # Divide por títulos (##, ###, etc.)
@@ -78,29 +108,38 @@ def chunk_code_intelligently(file_path: str, text: str) -> List[str]:
         return chunks
 
 
-def build_index(root_dir: str = ".", index_path: str = "index.faiss", meta_path: str = "meta.json", model_name: str = DEFAULT_MODEL, batch_size: int = 32):
-    """Roda a indexação: lê arquivos, cria chunks inteligentes, gera embeddings e grava."""
+def build_index(root_dir: str = ".", index_path: str = "index.faiss", meta_path: str = "meta.json", model_name: str = DEFAULT_MODEL, batch_size: int = 32, model=None, precision: str = "float32", rerank: bool = False, backend: str = None, dedup: bool = True, dedup_threshold: float = 0.8):
+    """Roda a indexação: lê arquivos, cria chunks inteligentes, gera embeddings e grava.
+
+    `precision` ('float32', 'float16' ou 'int8') define como os vetores ficam no
+    índice; com `rerank`, os vetores float32 também são gravados (lidos via mmap)
+    para reordenar os candidatos pelo score exato. Com `dedup`, chunks quase
+    duplicados (MinHash/LSH) são indexados uma única vez."""
     docs = read_text_files(root_dir)
     if not docs:
         print("Nenhum documento encontrado para indexar.")
         return False
 
-    model = SentenceTransformer(model_name)
+    model = model or load_embedder(model_name, backend)
 
     metas = []
     all_chunks_text = []
     print("Criando chunks inteligentes dos arquivos...")
     for d in docs:
-        chunks = chunk_code_intelligently(d["path"], d["text"])
-        for c in chunks:
+        for c, kind in chunk_with_kinds(d["path"], d["text"]):
             if c.strip():
-                metas.append({"path": d["path"], "text": c})
+                metas.append({"path": d["path"], "text": c, "kind": kind})
                 all_chunks_text.append(c)
 
     if not all_chunks_text:
         print("Nenhum chunk gerado.")
         return False
 
+    if dedup:
+        total = len(all_chunks_text)
+        metas, all_chunks_text, removidos = dedup_chunks(metas, all_chunks_text, threshold=dedup_threshold)
+        print(f"Deduplicação: {removidos} de {total} chunks removidos como quase duplicados ({len(all_chunks_text)} restantes).")
+
     print(f"Gerando embeddings para {len(all_chunks_text)} chunks (batch_size={batch_size}) usando '{model_name}' ...")
     embeddings = model.encode(all_chunks_text, show_progress_bar=True, batch_size=batch_size, convert_to_numpy=True)
 
@@ -108,30 +147,88 @@ def build_index(root_dir: str = ".", index_path: str = "index.faiss", meta_path:
     faiss.normalize_L2(X)
 
     dim = X.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(X)
-    faiss.write_index(index, index_path)
+    index = build_index_with_precision(X, precision)
 
-    with open(meta_path, "w", encoding="utf-8") as f:
+    # grava em arquivos temporários e troca no fim, para o agente em execução
+    # nunca recarregar um índice pela metade
+    faiss.write_index(index, index_path + ".tmp")
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
         json.dump(metas, f, ensure_ascii=False)
-
-    print(f"Index criado: {index_path} (dim={dim}, items={len(metas)})")
+    # atributos colunares para busca filtrada (caminho, extensão, tipo)
+    ChunkAttributes.from_metas(metas).save(attrs_path_for(index_path))
+    if rerank:
+        save_vectors(X, index_path)
+    elif os.path.exists(vectors_path_for(index_path)):
+        os.remove(vectors_path_for(index_path))
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    print(f"Index criado: {index_path} (dim={dim}, items={len(metas)}, precisão={precision}{', re-ranking' if rerank else ''})")
     return True
 
 
+def shard_paths(shard_name: str, shards_dir: str = DEFAULT_SHARDS_DIR):
+    """Caminhos (index, meta) de um shard."""
+    d = os.path.join(shards_dir, shard_name)
+    return os.path.join(d, "index.faiss"), os.path.join(d, "meta.json")
+
+
+def build_shard(root_dir: str, shard_name: str = None, shards_dir: str = DEFAULT_SHARDS_DIR, model_name: str = DEFAULT_MODEL, batch_size: int = 32, model=None, precision: str = "float32", rerank: bool = False, backend: str = None, dedup: bool = True, dedup_threshold: float = 0.8):
+    """Indexa um repositório como um shard independente (nome padrão: nome da pasta)."""
+    name = shard_name or Path(root_dir).resolve().name
+    index_path, meta_path = shard_paths(name, shards_dir)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    print(f"Shard '{name}' <- {root_dir}")
+    return build_index(root_dir, index_path=index_path, meta_path=meta_path, model_name=model_name, batch_size=batch_size, model=model, precision=precision, rerank=rerank, backend=backend, dedup=dedup, dedup_threshold=dedup_threshold)
+
+
 if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser()
-    p.add_argument("root", nargs="?", default=".", help="pasta do projeto a indexar")
+    p.add_argument("roots", nargs="*", default=["."], help="pasta(s) do(s) projeto(s) a indexar")
     p.add_argument("--index", default="data/index.faiss")
     p.add_argument("--meta", default="data/meta.json")
     p.add_argument("--model", default=DEFAULT_MODEL)
     p.add_argument("--batch-size", type=int, default=32, dest="batch_size", help="batch size para geração de embeddings")
+    p.add_argument("--sharded", action="store_true", help="indexa cada pasta como um shard separado em --shards-dir")
+    p.add_argument("--shards-dir", default=DEFAULT_SHARDS_DIR, dest="shards_dir")
+    p.add_argument("--shard", default=None, help="nome do shard (apenas com uma pasta; padrão: nome da pasta)")
+    p.add_argument("--precision", choices=PRECISIONS, default="float32", help="armazenamento dos vetores no índice")
+    p.add_argument("--rerank", action="store_true", help="grava vetores float32 (mmap) para reordenar os candidatos pelo score exato")
+    p.add_argument("--no-dedup", action="store_false", dest="dedup", help="não remove chunks quase duplicados")
+    p.add_argument("--dedup-threshold", type=float, default=0.8, dest="dedup_threshold", help="similaridade de Jaccard mínima para considerar duplicado")
+    p.add_argument("--backend", choices=BACKENDS, default=None, help="backend de embeddings (padrão: EMBEDDING_BACKEND ou torch)")
     args = p.parse_args()
-    build_index(
-        args.root,
-        index_path=args.index,
-        meta_path=args.meta,
-        model_name=args.model,
-        batch_size=args.batch_size,
-    )
+
+    if args.sharded or args.shard:
+        if args.shard and len(args.roots) > 1:
+            p.error("--shard só pode ser usado com uma pasta")
+        model = load_embedder(args.model, args.backend)
+        for root in args.roots:
+            build_shard(
+                root,
+                shard_name=args.shard,
+                shards_dir=args.shards_dir,
+                model_name=args.model,
+                batch_size=args.batch_size,
+                model=model,
+                precision=args.precision,
+                rerank=args.rerank,
+                dedup=args.dedup,
+                dedup_threshold=args.dedup_threshold,
+            )
+    else:
+        if len(args.roots) > 1:
+            p.error("várias pastas exigem --sharded")
+        build_index(
+            args.roots[0],
+            index_path=args.index,
+            meta_path=args.meta,
+            model_name=args.model,
+            batch_size=args.batch_size,
+            precision=args.precision,
+            rerank=args.rerank,
+            backend=args.backend,
+            dedup=args.dedup,
+            dedup_threshold=args.dedup_threshold,
+        )
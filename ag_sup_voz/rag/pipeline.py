@@ -1,19 +1,29 @@
 """
 Arquivo responsável por executar o pipeline RAG (Retrieval-Augmented Generation).
-Consulta o índice de documentos e chama um modelo de linguagem (LLM) 
+Consulta o índice de documentos e chama um modelo de linguagem (LLM)
 para gerar respostas baseadas no contexto recuperado.
+
+Além de uma pergunta avulsa, processa lotes de perguntas em JSONL: a busca é
+feita em lotes, as chamadas ao LLM rodam em paralelo com limite de taxa e as
+respostas são gravadas em JSONL conforme ficam prontas (retomável).
+
+Uso:
+    python rag/pipeline.py "pergunta"
+    python rag/pipeline.py --input perguntas.jsonl --output respostas.jsonl
 """
 import os
+import sys
 import json
+import time
+import hashlib
 import textwrap
+import threading
 from typing import List
-
-import sys
-import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.rag_query import query
+from rag.query import DEFAULT_SHARDS_DIR, get_model, load_index_files, load_shards, search_shards_batch
 
 # LLM client: usa OpenAI por exemplo (opcional)
 try:
@@ -36,6 +46,13 @@ Pergunta:
 Instruções: responda em português, seja objetivo, cite arquivos e trechos quando relevante.
 """)
 
+_client = None
+_client_lock = threading.Lock()
+
+# Erro gravado no lote quando a resposta é só o contexto (sem LLM configurado),
+# para que a pergunta seja refeita ao retomar com o LLM disponível
+LLM_UNAVAILABLE = "llm indisponível"
+
 
 def assemble_context(chunks: List[dict], max_tokens_chars: int = 4000) -> str:
     out = []
@@ -49,30 +66,241 @@ def assemble_context(chunks: List[dict], max_tokens_chars: int = 4000) -> str:
     return "\n".join(out)
 
 
+def _get_client():
+    """Cliente OpenAI compartilhado entre threads (None se não configurado)."""
+    global _client
+    if not (OPENAI_AVAILABLE and OPENAI_API_KEY):
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        return _client
+
+
 def call_llm(question: str, context_chunks: List[dict]):
     context = assemble_context(context_chunks)
     prompt = PROMPT_TEMPLATE.format(context=context, question=question)
 
-    if OPENAI_AVAILABLE and OPENAI_API_KEY:
-        openai.api_key = OPENAI_API_KEY
-        response = openai.ChatCompletion.create(
+    client = _get_client()
+    if client is not None:
+        response = client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=512,
             temperature=0.2
         )
-        return response["choices"][0]["message"]["content"].strip()
+        return response.choices[0].message.content.strip()
 
     # fallback simples: concatenar contexto + pergunta
     fallback = "CONTEXT:\n" + context + "\nQUESTION:\n" + question
     return fallback
 
 
+def load_retrieval(index_path: str = "data/index.faiss", meta_path: str = "data/meta.json", shards_dir: str = DEFAULT_SHARDS_DIR) -> dict:
+    """Carrega o índice monolítico (se existir) e os shards como {nome: LoadedIndex}."""
+    shards = {}
+    if os.path.exists(index_path) and os.path.exists(meta_path):
+        shards["default"] = load_index_files(index_path, meta_path)
+    shards.update(load_shards(shards_dir))
+    return shards
+
+
+class RateLimiter:
+    """Limita o número de chamadas iniciadas por segundo, entre threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _question_id(item: dict, question: str) -> str:
+    if item.get("id") is not None:
+        return str(item["id"])
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()[:16]
+
+
+def read_questions(path: str):
+    """Lê perguntas de um JSONL. Cada linha: {"id": ..., "question": ...}
+    (também aceita "query" ou "pergunta"; sem id, usa um hash da pergunta)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                print(f"[AVISO] Linha {n} ignorada: JSON inválido.")
+                continue
+            question = item.get("question") or item.get("query") or item.get("pergunta")
+            if not question:
+                print(f"[AVISO] Linha {n} ignorada: sem pergunta.")
+                continue
+            yield _question_id(item, question), question
+
+
+def _prepare_output(path: str) -> set:
+    """Prepara o arquivo de saída para retomar e retorna os ids já respondidos.
+
+    Uma linha final truncada (escrita interrompida) e os registros com erro (que
+    serão refeitos) são removidos, regravando o arquivo de forma atômica; assim
+    cada id fica com um único registro e o próximo append começa em linha nova."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    manter = []
+    mudou = False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                mudou = True  # última linha truncada por uma interrupção
+                continue
+            if not line.endswith("\n"):
+                line += "\n"
+                mudou = True
+            if "id" not in item or "error" in item or str(item["id"]) in done:
+                mudou = True
+                continue
+            done.add(str(item["id"]))
+            manter.append(line)
+    if mudou:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(manter)
+        os.replace(tmp, path)
+    return done
+
+
+def _batches(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_batch(input_path: str, output_path: str, shards: dict, k: int = 5, batch_size: int = 32, concurrency: int = 8, rate: float = 5.0, only=None, filters: dict = None) -> dict:
+    """Responde todas as perguntas de `input_path` e grava em `output_path` (JSONL).
+
+    Perguntas já respondidas no arquivo de saída são puladas e as que deram
+    erro são refeitas (o registro com erro é substituído). Retorna as
+    estatísticas de throughput e de tempo por etapa."""
+    done = _prepare_output(output_path)
+    limiter = RateLimiter(rate)
+    stats = {"questions": 0, "skipped": 0, "errors": 0, "retrieval_s": 0.0, "llm_s": 0.0, "write_s": 0.0}
+    model = get_model()
+
+    def _answer(qid, question, chunks):
+        limiter.wait()
+        inicio = time.perf_counter()
+        try:
+            answer, error = call_llm(question, chunks), None
+            if _get_client() is None:
+                error = LLM_UNAVAILABLE
+        except Exception as e:
+            answer, error = None, str(e)
+        return qid, question, chunks, answer, error, time.perf_counter() - inicio
+
+    def _write(out, fut):
+        qid, question, chunks, answer, error, llm_s = fut.result()
+        stats["llm_s"] += llm_s
+        record = {"id": qid, "question": question, "answer": answer, "sources": [c.get("path") for c in chunks], "llm_ms": round(llm_s * 1000, 1)}
+        if error:
+            record["error"] = error
+            stats["errors"] += 1
+        inicio = time.perf_counter()
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        stats["write_s"] += time.perf_counter() - inicio
+        stats["questions"] += 1
+
+    inicio_total = time.perf_counter()
+    pendentes = set()
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm") as pool:
+        for batch in _batches(read_questions(input_path), batch_size):
+            novos = [(qid, q) for qid, q in batch if qid not in done]
+            stats["skipped"] += len(batch) - len(novos)
+            if not novos:
+                continue
+            inicio = time.perf_counter()
+            resultados = search_shards_batch(shards, [q for _, q in novos], k=k, only=only, model=model, filters=filters, batch_size=batch_size)
+            stats["retrieval_s"] += time.perf_counter() - inicio
+
+            for (qid, question), chunks in zip(novos, resultados):
+                done.add(qid)
+                pendentes.add(pool.submit(_answer, qid, question, chunks))
+
+            # limita o trabalho em andamento e grava o que já terminou
+            while len(pendentes) > 2 * concurrency:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for fut in prontos:
+                    _write(out, fut)
+
+        while pendentes:
+            prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for fut in prontos:
+                _write(out, fut)
+
+    stats["elapsed_s"] = time.perf_counter() - inicio_total
+    stats["qps"] = stats["questions"] / stats["elapsed_s"] if stats["elapsed_s"] > 0 else 0.0
+    return stats
+
+
+def print_stats(stats: dict):
+    n = max(stats["questions"], 1)
+    print(f"{stats['questions']} perguntas respondidas, {stats['skipped']} já existentes, {stats['errors']} com erro")
+    print(f"tempo total: {stats['elapsed_s']:.2f}s | {stats['qps']:.2f} perguntas/s")
+    print(f"busca: {stats['retrieval_s']:.2f}s ({stats['retrieval_s'] * 1000 / n:.1f}ms/pergunta)")
+    print(f"LLM:   {stats['llm_s']:.2f}s somados ({stats['llm_s'] * 1000 / n:.1f}ms/pergunta, em paralelo)")
+    print(f"escrita: {stats['write_s']:.2f}s")
+
+
 if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser()
-    p.add_argument("query")
+    p.add_argument("query", nargs="?", help="pergunta avulsa")
+    p.add_argument("--input", help="JSONL de perguntas ({\"id\": ..., \"question\": ...} por linha)")
+    p.add_argument("--output", help="JSONL de saída (retomável: ids já respondidos são pulados)")
+    p.add_argument("-k", type=int, default=5)
+    p.add_argument("--index", default="data/index.faiss")
+    p.add_argument("--meta", default="data/meta.json")
+    p.add_argument("--shards-dir", default=DEFAULT_SHARDS_DIR, dest="shards_dir")
+    p.add_argument("--shard", action="append", default=None, help="restringe a busca a este shard (pode repetir)")
+    p.add_argument("--batch-size", type=int, default=32, dest="batch_size", help="perguntas por lote de busca")
+    p.add_argument("--concurrency", type=int, default=8, help="chamadas simultâneas ao LLM")
+    p.add_argument("--rate", type=float, default=5.0, help="máximo de chamadas ao LLM por segundo (0 = sem limite)")
     args = p.parse_args()
-    chunks = query(args.query)
-    answer = call_llm(args.query, chunks)
-    print(answer)
+
+    shards = load_retrieval(args.index, args.meta, args.shards_dir)
+    if not shards:
+        p.error("nenhum índice encontrado; rode rag/index.py primeiro")
+
+    if args.input:
+        if not args.output:
+            p.error("--input exige --output")
+        if _get_client() is None:
+            print(f"[AVISO] LLM não configurado (OPENAI_API_KEY): as respostas serão só o contexto, gravadas com \"error\": \"{LLM_UNAVAILABLE}\" e refeitas na próxima execução.")
+        stats = run_batch(args.input, args.output, shards, k=args.k, batch_size=args.batch_size, concurrency=args.concurrency, rate=args.rate, only=args.shard)
+        print_stats(stats)
+    elif args.query:
+        chunks = search_shards_batch(shards, [args.query], k=args.k, only=args.shard)[0]
+        answer = call_llm(args.query, chunks)
+        print(answer)
+    else:
+        p.error("informe uma pergunta ou --input/--output")
@@ -0,0 +1,152 @@
+"""
+Arquivo com as opções de precisão do índice RAG e o relatório de comparação.
+
+- float32: vetores completos (IndexFlatIP), 4 bytes por dimensão.
+- float16: scalar quantizer de 16 bits, 2 bytes por dimensão.
+- int8:    scalar quantizer de 8 bits (treinado com min/máx por dimensão), 1 byte.
+
+Opcionalmente, os vetores float32 são gravados em `index.vectors.npy` e abertos
+com mmap: a busca pega mais candidatos no índice quantizado e os reordena pelo
+score exato, sem manter os vetores completos na memória.
+
+Uso do relatório (memória, latência e recall@k contra o float32):
+    python rag/quantization.py data/index.faiss -k 5
+"""
+
+import os
+import time
+
+import numpy as np
+import faiss
+
+PRECISIONS = ("float32", "float16", "int8")
+# Quantos candidatos por resultado buscar no índice quantizado antes de reordenar
+RERANK_FACTOR = 4
+
+_QTYPES = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def vectors_path_for(index_path: str) -> str:
+    """Caminho dos vetores float32 para re-ranking (index.faiss -> index.vectors.npy)."""
+    return os.path.splitext(index_path)[0] + ".vectors.npy"
+
+
+def build_index_with_precision(X: np.ndarray, precision: str = "float32"):
+    """Cria um índice de produto interno com a precisão pedida e adiciona X."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precisão desconhecida: {precision} (opções: {', '.join(PRECISIONS)})")
+    dim = X.shape[1]
+    if precision == "float32":
+        index = faiss.IndexFlatIP(dim)
+    else:
+        index = faiss.IndexScalarQuantizer(dim, _QTYPES[precision], faiss.METRIC_INNER_PRODUCT)
+        index.train(X)
+    index.add(X)
+    return index
+
+
+def save_vectors(X: np.ndarray, index_path: str):
+    path = vectors_path_for(index_path)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, X.astype("float32"))
+    os.replace(tmp, path)
+
+
+def load_vectors(index_path: str):
+    """Abre os vetores de re-ranking com mmap (None se não existirem)."""
+    path = vectors_path_for(index_path)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def rerank(q: np.ndarray, ids, vectors, k: int):
+    """Reordena candidatos pelo produto interno exato. Retorna [(score, id), ...]."""
+    # ids ordenados: leitura sequencial dos vetores no mmap
+    ids = np.sort(np.asarray([i for i in ids if 0 <= i < len(vectors)], dtype="int64"))
+    if ids.size == 0:
+        return []
+    scores = np.asarray(vectors[ids] @ q[0], dtype="float32")
+    order = np.argsort(-scores)[:k]
+    return [(float(scores[j]), int(ids[j])) for j in order]
+
+
+def index_memory_bytes(index) -> int:
+    """Tamanho do índice serializado (aproxima a memória ocupada)."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found))
+    total = sum(int((t >= 0).sum()) for t in truth)
+    return hits / total if total else 1.0
+
+
+def _timed_search(fn, queries: np.ndarray):
+    fn(queries[:1])  # aquecimento
+    inicio = time.perf_counter()
+    found = np.vstack([fn(queries[i:i + 1]) for i in range(len(queries))])
+    return found, (time.perf_counter() - inicio) * 1000 / len(queries)
+
+
+def compare_precisions(X: np.ndarray, queries: np.ndarray, k: int = 5, rerank_factor: int = RERANK_FACTOR) -> list:
+    """Compara memória, latência por consulta e recall@k de cada precisão
+    (com e sem re-ranking) contra o índice float32."""
+    X = np.ascontiguousarray(X, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    base = build_index_with_precision(X, "float32")
+    truth, base_ms = _timed_search(lambda q: base.search(q, k)[1], queries)
+    base_mem = index_memory_bytes(base)
+
+    rows = [{"precision": "float32", "memory_bytes": base_mem, "memory_saved": 0.0, "latency_ms": base_ms, "recall": 1.0}]
+    for precision in PRECISIONS[1:]:
+        index = build_index_with_precision(X, precision)
+        mem = index_memory_bytes(index)
+        found, ms = _timed_search(lambda q: index.search(q, k)[1], queries)
+        rows.append({"precision": precision, "memory_bytes": mem, "memory_saved": 1 - mem / base_mem, "latency_ms": ms, "recall": _recall(truth, found)})
+
+        def _with_rerank(q):
+            _, I = index.search(q, k * rerank_factor)
+            ids = [i for _, i in rerank(q, I[0], X, k)]
+            return np.array([ids + [-1] * (k - len(ids))])
+
+        found, ms = _timed_search(_with_rerank, queries)
+        rows.append({"precision": f"{precision}+rerank", "memory_bytes": mem, "memory_saved": 1 - mem / base_mem, "latency_ms": ms, "recall": _recall(truth, found)})
+    return rows
+
+
+def print_report(rows: list, k: int):
+    print(f"{'precisão':<16}{'memória':>12}{'economia':>10}{'latência':>12}{f'recall@{k}':>11}")
+    for r in rows:
+        print(f"{r['precision']:<16}{r['memory_bytes'] / 1e6:>10.2f}MB{r['memory_saved']:>10.0%}{r['latency_ms']:>10.3f}ms{r['recall']:>11.3f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser(description="Relatório de memória/latência/recall das precisões do índice")
+    p.add_argument("index", nargs="?", default="data/index.faiss", help="índice float32 existente")
+    p.add_argument("-k", type=int, default=5)
+    p.add_argument("--queries", type=int, default=200, help="quantos vetores do índice usar como consulta")
+    p.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR, dest="rerank_factor")
+    args = p.parse_args()
+
+    base_index = faiss.read_index(args.index)
+    vectors = load_vectors(args.index)
+    if vectors is None:
+        if not isinstance(base_index, faiss.IndexFlat):
+            p.error("o índice não é float32 e não há vetores salvos (.vectors.npy) para comparar")
+        vectors = base_index.reconstruct_n(0, base_index.ntotal)
+    vectors = np.asarray(vectors, dtype="float32")
+
+    # consultas: vetores do próprio índice com um pouco de ruído (simula perguntas próximas)
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = sample + rng.normal(scale=0.05, size=sample.shape).astype("float32")
+    faiss.normalize_L2(queries)
+
+    print(f"{len(vectors)} vetores, dim={vectors.shape[1]}, {len(queries)} consultas")
+    print_report(compare_precisions(vectors, queries, k=args.k, rerank_factor=args.rerank_factor), args.k)
@@ -4,41 +4,201 @@ e retornar os metadados dos documentos mais relevantes
 baseados em uma consulta de texto.
 """
 
+import os
+import sys
 import json
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 
-DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.embeddings import DEFAULT_MODEL, load_embedder
+from rag.filters import ChunkAttributes, load_attributes
+from rag.quantization import RERANK_FACTOR, load_vectors, rerank
+
+DEFAULT_SHARDS_DIR = "data/shards"
+
+_models = {}
+_models_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+# Índice carregado com seus dados auxiliares: atributos para filtros e, se o
+# índice for quantizado com re-ranking, os vetores float32 (mmap).
+LoadedIndex = namedtuple("LoadedIndex", ["index", "metas", "attrs", "vectors"], defaults=(None, None))
+
+
+def get_model(model_name: str = DEFAULT_MODEL):
+    """Carrega o modelo de embeddings uma única vez por processo
+    (backend definido por EMBEDDING_BACKEND: torch, onnx ou onnx-int8)."""
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = load_embedder(model_name)
+        return _models[model_name]
 
 
 def load_index(index_path: str = "data/index.faiss", meta_path: str = "data/meta.json"):
     index = faiss.read_index(index_path)
     with open(meta_path, "r", encoding="utf-8") as f:
         metas = json.load(f)
-    model = SentenceTransformer(DEFAULT_MODEL)
+    model = get_model()
     return index, metas, model
 
 
-def query(query_text: str, index_path: str = "data/index.faiss", meta_path: str = "data/meta.json", k: int = 5):
-    index, metas, model = load_index(index_path, meta_path)
+def load_index_files(index_path: str, meta_path: str) -> LoadedIndex:
+    """Carrega índice, metadados, atributos e vetores de re-ranking (se houver)."""
+    index = faiss.read_index(index_path)
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metas = json.load(f)
+    return LoadedIndex(index, metas, load_attributes(index_path, metas), load_vectors(index_path))
+
+
+def _encode_query(model, query_text: str):
     q_emb = model.encode(query_text)
     q = np.array([q_emb]).astype("float32")
     faiss.normalize_L2(q)
-    D, I = index.search(q, k)
+    return q
+
+
+def _encode_queries(model, query_texts: list, batch_size: int = 32):
+    Q = np.asarray(model.encode(list(query_texts), batch_size=batch_size, convert_to_numpy=True), dtype="float32")
+    Q = np.ascontiguousarray(Q.reshape(len(query_texts), -1))
+    faiss.normalize_L2(Q)
+    return Q
+
+
+def _search_filtered(index, attrs, q, k: int, filters: dict = None):
+    """Busca no índice aplicando os filtros dentro do FAISS (IDSelector)."""
+    if not filters:
+        return index.search(q, k)
+    params = attrs.search_params(filters)
+    if params is None:
+        return np.empty((len(q), 0), dtype="float32"), np.empty((len(q), 0), dtype="int64")
+    return index.search(q, k, params=params)
+
+
+def _search_entry_batch(entry: LoadedIndex, Q, k: int, filters: dict = None):
+    """Busca várias consultas (uma por linha de Q) em um índice carregado e retorna,
+    para cada uma, [(score, id), ...]. Se houver vetores float32, busca
+    RERANK_FACTOR * k candidatos e reordena pelo score exato."""
+    n = len(entry.metas)
+    if entry.vectors is None:
+        D, I = _search_filtered(entry.index, entry.attrs, Q, k, filters)
+        return [[(float(score), int(idx)) for score, idx in zip(D[r], I[r]) if 0 <= idx < n] for r in range(len(Q))]
+    _, I = _search_filtered(entry.index, entry.attrs, Q, k * RERANK_FACTOR, filters)
+    return [[(score, idx) for score, idx in rerank(Q[r:r + 1], I[r], entry.vectors, k) if idx < n] for r in range(len(Q))]
+
+
+def _search_entry(entry: LoadedIndex, q, k: int, filters: dict = None):
+    return _search_entry_batch(entry, q, k, filters)[0]
+
+
+def search(index, metas, query_text: str, k: int = 5, model=None, filters: dict = None, attrs=None, vectors=None):
+    """Consulta um índice já carregado (ex.: o bundle de artefatos ativo).
+    `filters` restringe por caminho/extensão/tipo (ver rag/filters.py)."""
+    model = model or get_model()
+    q = _encode_query(model, query_text)
+    if filters and attrs is None:
+        attrs = ChunkAttributes.from_metas(metas)
+    return [metas[idx] for _, idx in _search_entry(LoadedIndex(index, metas, attrs, vectors), q, k, filters)]
+
+
+def query(query_text: str, index_path: str = "data/index.faiss", meta_path: str = "data/meta.json", k: int = 5, filters: dict = None):
+    entry = load_index_files(index_path, meta_path)
+    return search(entry.index, entry.metas, query_text, k, get_model(), filters=filters, attrs=entry.attrs, vectors=entry.vectors)
+
+
+def list_shards(shards_dir: str = DEFAULT_SHARDS_DIR) -> list:
+    """Nomes dos shards completos (com index.faiss e meta.json) em `shards_dir`."""
+    if not os.path.isdir(shards_dir):
+        return []
+    return [
+        name for name in sorted(os.listdir(shards_dir))
+        if os.path.exists(os.path.join(shards_dir, name, "index.faiss"))
+        and os.path.exists(os.path.join(shards_dir, name, "meta.json"))
+    ]
+
+
+def load_shards(shards_dir: str = DEFAULT_SHARDS_DIR, names=None) -> dict:
+    """Carrega os shards como {nome: LoadedIndex}."""
+    shards = {}
+    for name in names if names is not None else list_shards(shards_dir):
+        shards[name] = load_index_files(os.path.join(shards_dir, name, "index.faiss"), os.path.join(shards_dir, name, "meta.json"))
+    return shards
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=min(32, os.cpu_count() or 4), thread_name_prefix="rag-shard")
+        return _executor
+
+
+def search_shards(shards: dict, query_text: str, k: int = 5, only=None, model=None, filters: dict = None):
+    """Busca em vários shards em paralelo e junta o top-k global por score.
+
+    `only` restringe a busca a um subconjunto de nomes de shards e `filters` por
+    caminho/extensão/tipo. Cada resultado recebe as chaves 'shard' e 'score'."""
+    return search_shards_batch(shards, [query_text], k, only=only, model=model, filters=filters)[0]
+
+
+def search_shards_batch(shards: dict, query_texts: list, k: int = 5, only=None, model=None, filters: dict = None, batch_size: int = 32):
+    """Versão em lote de `search_shards`: codifica todas as consultas de uma vez e
+    faz uma busca por shard para o lote inteiro. Retorna uma lista por consulta."""
+    selecionados = [(name, s) for name, s in shards.items() if only is None or name in only]
+    if not selecionados or not query_texts:
+        return [[] for _ in query_texts]
+    model = model or get_model()
+    if len(query_texts) == 1:
+        Q = _encode_query(model, query_texts[0])
+    else:
+        Q = _encode_queries(model, query_texts, batch_size=batch_size)
+
+    def _one(item):
+        name, entry = item
+        return [[(score, name, entry.metas[idx]) for score, idx in row] for row in _search_entry_batch(entry, Q, k, filters)]
+
+    # o FAISS libera o GIL durante a busca, então threads rodam em paralelo
+    if len(selecionados) == 1:
+        partes = [_one(selecionados[0])]
+    else:
+        partes = list(_get_executor().map(_one, selecionados))
     results = []
-    for idx in I[0]:
-        if idx < len(metas):
-            results.append(metas[idx])
+    for r in range(len(query_texts)):
+        top = heapq.nlargest(k, itertools.chain.from_iterable(p[r] for p in partes), key=lambda t: t[0])
+        results.append([dict(meta, shard=name, score=score) for score, name, meta in top])
     return results
 
+
+def query_shards(query_text: str, shards_dir: str = DEFAULT_SHARDS_DIR, k: int = 5, only=None, filters: dict = None):
+    shards = load_shards(shards_dir, names=[n for n in list_shards(shards_dir) if only is None or n in only])
+    return search_shards(shards, query_text, k, filters=filters)
+
 if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser()
     p.add_argument("query")
+    p.add_argument("-k", type=int, default=5)
+    p.add_argument("--sharded", action="store_true", help="busca nos shards de --shards-dir")
+    p.add_argument("--shards-dir", default=DEFAULT_SHARDS_DIR, dest="shards_dir")
+    p.add_argument("--shard", action="append", default=None, help="restringe a busca a este shard (pode repetir)")
+    p.add_argument("--ext", action="append", default=None, help="filtra por extensão, ex.: .py (pode repetir)")
+    p.add_argument("--kind", action="append", default=None, help="filtra por tipo de chunk: class, function, module, section, text")
+    p.add_argument("--path-prefix", action="append", default=None, dest="path_prefix", help="filtra por prefixo de caminho")
+    p.add_argument("--exclude-path-prefix", action="append", default=None, dest="exclude_path_prefix", help="exclui um prefixo de caminho")
     args = p.parse_args()
-    res = query(args.query)
+    filters = {k: v for k, v in (("ext", args.ext), ("kind", args.kind), ("path_prefix", args.path_prefix), ("exclude_path_prefix", args.exclude_path_prefix)) if v}
+    if args.sharded or args.shard:
+        res = query_shards(args.query, args.shards_dir, k=args.k, only=args.shard, filters=filters)
+    else:
+        res = query(args.query, k=args.k, filters=filters)
     for r in res:
-        print(r["path"])
+        print(f"[{r['shard']}] {r['path']} ({r['score']:.3f})" if "shard" in r else r["path"])
         print(r["text"][:400])
         print("---")
@@ -1,32 +1,319 @@
-""" Arquivo para reconhecimento de voz e síntese de fala
-    usando SpeechRecognition e pyttsx3.
+""" Arquivo para reconhecimento de voz em fluxo contínuo.
+
+    O áudio (microfone ou arquivo WAV) é lido em quadros curtos, um detector de
+    atividade de voz (VAD) separa as falas e cada fala é enviada a um
+    reconhecedor plugável (Google, online, ou Vosk, offline). A captura e o
+    reconhecimento rodam em segundo plano, então a próxima fala já está sendo
+    reconhecida enquanto o agente responde a atual.
 """
 
-import speech_recognition as sr
-import pyttsx3
+import os
+import json
+import wave
+import queue
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+SAMPLE_WIDTH = 2  # PCM 16 bits
+
+
+# --- Fontes de áudio ---
+
+def microphone_frames(sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS, stop_event: threading.Event = None):
+    """Lê quadros PCM 16 bits mono do microfone padrão."""
+    import speech_recognition as sr
+
+    n = int(sample_rate * frame_ms / 1000)
+    with sr.Microphone(sample_rate=sample_rate, chunk_size=n) as source:
+        while stop_event is None or not stop_event.is_set():
+            yield source.stream.read(n)
 
-r = sr.Recognizer()
-engine = pyttsx3.init()
 
-while True:
-    with sr.Microphone() as source:
-        print("Diga algo (ou 'sair' para encerrar):")
-        audio = r.listen(source)
+def wav_frames(path: str, frame_ms: int = FRAME_MS):
+    """Abre um WAV PCM 16 bits mono e retorna (taxa_de_amostragem, gerador_de_quadros).
+    Permite testar o pipeline sem microfone."""
+    wf = wave.open(path, "rb")
+    if wf.getnchannels() != 1 or wf.getsampwidth() != SAMPLE_WIDTH:
+        wf.close()
+        raise ValueError(f"{path}: esperado WAV mono PCM 16 bits")
+    sample_rate = wf.getframerate()
+    n = int(sample_rate * frame_ms / 1000)
 
+    def _gen():
         try:
-            texto = r.recognize_google(audio, language="pt-BR")
-            print("Você disse:", texto)
+            while True:
+                data = wf.readframes(n)
+                if len(data) < n * SAMPLE_WIDTH:
+                    if data:
+                        yield data + b"\x00" * (n * SAMPLE_WIDTH - len(data))
+                    break
+                yield data
+        finally:
+            wf.close()
+
+    return sample_rate, _gen()
+
+
+# --- Detecção de atividade de voz ---
+
+class EnergyVAD:
+    """VAD simples por energia (RMS) com piso de ruído adaptativo."""
+
+    def __init__(self, min_energy: float = 300.0, noise_ratio: float = 3.0, adapt: float = 0.05):
+        self.min_energy = min_energy
+        self.noise_ratio = noise_ratio
+        self.adapt = adapt
+        self.noise_floor = None
+
+    def is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        if samples.size == 0:
+            return False
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        speech = rms > max(self.min_energy, self.noise_floor * self.noise_ratio)
+        if not speech:
+            self.noise_floor += self.adapt * (rms - self.noise_floor)
+        return speech
+
+
+def segment_utterances(frames, vad=None, frame_ms: int = FRAME_MS, start_ms: int = 90, end_silence_ms: int = 600, preroll_ms: int = 300, max_ms: int = 15000):
+    """Agrupa quadros em falas. Uma fala começa após `start_ms` de voz contínua
+    (incluindo `preroll_ms` de áudio anterior) e termina após `end_silence_ms`
+    de silêncio ou ao atingir `max_ms`. Gera os bytes PCM de cada fala.
+    Um quadro `None` descarta a fala em andamento (ex.: captura pausada)."""
+    vad = vad or EnergyVAD()
+    start_frames = max(1, start_ms // frame_ms)
+    end_frames = max(1, end_silence_ms // frame_ms)
+    max_frames = max(1, max_ms // frame_ms)
+    preroll = collections.deque(maxlen=max(start_frames, preroll_ms // frame_ms))
+
+    fala = None
+    voz_seguida = 0
+    silencio = 0
+    for frame in frames:
+        if frame is None:
+            fala = None
+            voz_seguida = 0
+            preroll.clear()
+            continue
+        speech = vad.is_speech(frame)
+        if fala is None:
+            preroll.append(frame)
+            voz_seguida = voz_seguida + 1 if speech else 0
+            if voz_seguida >= start_frames:
+                fala = list(preroll)
+                preroll.clear()
+                silencio = 0
+            continue
+
+        fala.append(frame)
+        silencio = 0 if speech else silencio + 1
+        if silencio >= end_frames or len(fala) >= max_frames:
+            yield b"".join(fala)
+            fala = None
+            voz_seguida = 0
+
+    if fala:
+        yield b"".join(fala)
+
+
+# --- Reconhecedores ---
+
+class GoogleRecognizer:
+    """Reconhecimento online via SpeechRecognition/Google."""
+
+    def __init__(self, language: str = "pt-BR"):
+        import speech_recognition as sr
+
+        self._sr = sr
+        self._r = sr.Recognizer()
+        self.language = language
+
+    def recognize(self, pcm: bytes, sample_rate: int) -> str:
+        audio = self._sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+        try:
+            return self._r.recognize_google(audio, language=self.language)
+        except self._sr.UnknownValueError:
+            return ""
+
+
+class VoskRecognizer:
+    """Reconhecimento offline via Vosk (modelo local em VOSK_MODEL_PATH)."""
 
-            if "sair" in texto.lower():
-                print("Encerrando...")
+    def __init__(self, model_path: str = None):
+        from vosk import Model, KaldiRecognizer
+
+        model_path = model_path or os.environ.get("VOSK_MODEL_PATH")
+        if not model_path:
+            raise ValueError("Defina VOSK_MODEL_PATH com o caminho de um modelo Vosk em português.")
+        self._model = Model(model_path)
+        self._KaldiRecognizer = KaldiRecognizer
+
+    def recognize(self, pcm: bytes, sample_rate: int) -> str:
+        rec = self._KaldiRecognizer(self._model, sample_rate)
+        rec.AcceptWaveform(pcm)
+        return json.loads(rec.FinalResult()).get("text", "")
+
+
+RECOGNIZERS = {
+    "google": GoogleRecognizer,
+    "vosk": VoskRecognizer,
+}
+
+
+def criar_reconhecedor(nome: str = None):
+    """Cria o reconhecedor configurado (ASR_ENGINE: 'google' ou 'vosk').
+    Qualquer objeto com `recognize(pcm, sample_rate) -> str` também pode ser usado."""
+    nome = (nome or os.environ.get("ASR_ENGINE", "google")).lower()
+    if nome not in RECOGNIZERS:
+        raise ValueError(f"Reconhecedor desconhecido: {nome} (opções: {', '.join(RECOGNIZERS)})")
+    return RECOGNIZERS[nome]()
+
+
+# --- Pipeline ---
+
+class StreamingListener:
+    """Captura, segmenta e reconhece falas em segundo plano.
+
+    Iterar sobre o listener produz os textos reconhecidos, na ordem em que foram
+    falados. Enquanto o consumidor processa um texto, as próximas falas continuam
+    sendo capturadas e reconhecidas.
+
+    `pause()`/`resume()` descartam o áudio enquanto o próprio agente está
+    falando, para que a resposta dele não seja reconhecida como pergunta. Após
+    `resume()`, mais `guard_ms` de áudio são ignorados (eco do alto-falante).
+    Com `drop_while_paused=False` (fontes lidas sob demanda, como um WAV), a
+    leitura apenas espera o `resume()` e nenhum áudio é perdido."""
+
+    def __init__(self, frames, recognizer, sample_rate: int = SAMPLE_RATE, vad=None, frame_ms: int = FRAME_MS, workers: int = 2, guard_ms: int = 250, drop_while_paused: bool = True):
+        self._frames = frames
+        self._recognizer = recognizer
+        self._sample_rate = sample_rate
+        self._vad = vad
+        self._frame_ms = frame_ms
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asr")
+        self._pendentes = queue.Queue()
+        self._thread = None
+        self._pausado = threading.Event()
+        self._retomado = threading.Event()
+        self._retomado.set()
+        self._drop = drop_while_paused
+        self._guard_frames = guard_ms // frame_ms if drop_while_paused else 0
+        self._ignorar = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._capture, name="asr-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def pause(self):
+        """Para de aceitar áudio; a fala em andamento é descartada."""
+        self._retomado.clear()
+        self._pausado.set()
+
+    def resume(self):
+        if self._pausado.is_set():
+            self._ignorar = self._guard_frames
+            self._pausado.clear()
+        self._retomado.set()
+
+    @property
+    def paused(self) -> bool:
+        return self._pausado.is_set()
+
+    def _gated_frames(self):
+        """Repassa os quadros, trocando o áudio capturado durante a pausa por um
+        único `None` (que reinicia a segmentação). Sem descarte, espera o
+        `resume()` antes de ler o próximo quadro."""
+        descartando = False
+        for frame in self._lidos_sob_demanda():
+            if self._drop and self._pausado.is_set():
+                if not descartando:
+                    descartando = True
+                    yield None
+                continue
+            descartando = False
+            if self._ignorar > 0:
+                self._ignorar -= 1
+                continue
+            yield frame
+
+    def _lidos_sob_demanda(self):
+        """Quadros da fonte; sem descarte, só lê o próximo fora da pausa."""
+        it = iter(self._frames)
+        while True:
+            if not self._drop:
+                self._retomado.wait()
+            try:
+                yield next(it)
+            except StopIteration:
+                return
+
+    def _capture(self):
+        try:
+            for pcm in segment_utterances(self._gated_frames(), self._vad, frame_ms=self._frame_ms):
+                self._pendentes.put(self._executor.submit(self._recognizer.recognize, pcm, self._sample_rate))
+        except Exception as e:
+            print(f"[ERRO] Falha na captura de áudio: {e}")
+        finally:
+            self._pendentes.put(None)
+
+    def __iter__(self):
+        self.start()
+        while True:
+            fut = self._pendentes.get()
+            if fut is None:
                 break
+            try:
+                texto = fut.result()
+            except Exception as e:
+                print(f"[ERRO] Falha no reconhecimento de voz: {e}")
+                continue
+            if texto and texto.strip():
+                yield texto.strip()
+
+    def close(self):
+        close = getattr(self._frames, "close", None)
+        if close:
+            close()
+        self._executor.shutdown(wait=False)
+
+
+def ouvir(recognizer=None, wav_path: str = None, stop_event: threading.Event = None, paused: bool = False) -> StreamingListener:
+    """Cria um listener a partir do microfone ou de um arquivo WAV.
+
+    O WAV é lido sob demanda, então enquanto o listener está pausado a leitura
+    espera em vez de descartar o áudio. Com `paused`, o listener já começa
+    pausado (ex.: o agente ainda está falando)."""
+    recognizer = recognizer or criar_reconhecedor()
+    if wav_path:
+        sample_rate, frames = wav_frames(wav_path)
+    else:
+        sample_rate, frames = SAMPLE_RATE, microphone_frames(stop_event=stop_event)
+    listener = StreamingListener(frames, recognizer, sample_rate=sample_rate, drop_while_paused=not wav_path)
+    if paused:
+        listener.pause()
+    return listener.start()
+
 
-            # Resposta simples
-            resposta = f"Você disse: {texto}"
-            engine.say(resposta)
-            engine.runAndWait()
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument("--wav", help="arquivo WAV (mono, 16 bits) em vez do microfone")
+    p.add_argument("--engine", default=None, help="reconhecedor: google ou vosk")
+    args = p.parse_args()
 
-        except sr.UnknownValueError:
-            print("Não entendi o que você disse.")
-        except sr.RequestError as e:
-            print("Erro ao acessar o serviço; {0}".format(e))
+    print("Diga algo (ou 'sair' para encerrar):")
+    for texto in ouvir(criar_reconhecedor(args.engine), wav_path=args.wav):
+        print("Você disse:", texto)
+        if "sair" in texto.lower():
+            print("Encerrando...")
+            break
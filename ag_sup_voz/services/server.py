@@ -0,0 +1,286 @@
+""" Arquivo com o modo supervisor (pre-fork) para servir o agente via HTTP.
+
+    O supervisor carrega uma única vez os artefatos grandes e somente leitura
+    (índices FAISS, metadados e modelo de embeddings) e cria N workers com fork.
+    Os workers compartilham essa memória por copy-on-write e aceitam conexões do
+    mesmo socket, então o kernel distribui as requisições entre eles. Workers
+    que caírem são recriados.
+
+    Uso (Linux/macOS):
+        python services/server.py --workers 4 --port 8000
+        curl -X POST localhost:8000/responder -d '{"pergunta": "bom dia"}'
+
+    `kill -USR1 <pid do supervisor>` imprime o relatório de memória (RSS/PSS)
+    comparando com N processos independentes.
+
+    O TensorFlow não funciona num processo criado por fork depois de
+    inicializado, então o classificador Keras (pequeno) é carregado em cada
+    worker, após o fork. Antes de aceitar conexões, o worker roda uma inferência
+    de teste (modelo Keras e busca RAG com embedding + FAISS) e avisa o
+    supervisor; se um worker travar ou falhar nesse teste, o supervisor encerra
+    com erro em vez de servir com workers quebrados.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import select
+import signal
+import socket
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Se um worker cair logo após iniciar, espera antes de recriá-lo
+_RESTART_BACKOFF = 1.0
+# Tempo máximo para um worker concluir a inferência de teste após o fork
+_SMOKE_TIMEOUT = float(os.environ.get("SERVER_SMOKE_TIMEOUT", "60"))
+# Código de saída de um worker que falhou na inferência de teste
+_SMOKE_EXIT = 3
+
+
+def _memory_kb(pid: int) -> dict:
+    """RSS e PSS (kB) de um processo. PSS divide as páginas compartilhadas entre
+    os processos que as usam, então a soma dos PSS é a memória real do grupo."""
+    mem = {"rss": 0, "pss": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    mem[key.lower()] = int(rest.split()[0])
+    except OSError:
+        pass
+    return mem
+
+
+def memory_report(supervisor_pid: int, worker_pids: list, preload_rss_kb: int):
+    procs = [supervisor_pid] + list(worker_pids)
+    mems = [_memory_kb(pid) for pid in procs]
+    if not any(m["pss"] for m in mems):
+        print("[AVISO] /proc/<pid>/smaps_rollup indisponível; relatório de memória apenas no Linux.")
+        return
+    total_rss = sum(m["rss"] for m in mems)
+    total_pss = sum(m["pss"] for m in mems)
+    # cada processo independente carregaria sua própria cópia dos artefatos
+    independentes = preload_rss_kb * len(worker_pids)
+    print(f"[MEMÓRIA] supervisor + {len(worker_pids)} workers: PSS {total_pss / 1024:.1f}MB (soma RSS {total_rss / 1024:.1f}MB)")
+    print(f"[MEMÓRIA] {len(worker_pids)} processos independentes (~{preload_rss_kb / 1024:.1f}MB cada): ~{independentes / 1024:.1f}MB")
+    print(f"[MEMÓRIA] economia estimada: ~{(independentes - total_pss) / 1024:.1f}MB")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/saude":
+            from models.artifacts import active_version
+
+            self._send_json(200, {"ok": True, "worker": os.getpid(), "versao": active_version()})
+        else:
+            self._send_json(404, {"erro": "rota não encontrada"})
+
+    def do_POST(self):
+        if self.path != "/responder":
+            self._send_json(404, {"erro": "rota não encontrada"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            pergunta = body.get("pergunta") or body.get("question")
+        except (ValueError, AttributeError):
+            self._send_json(400, {"erro": "JSON inválido"})
+            return
+        if not pergunta:
+            self._send_json(400, {"erro": "campo 'pergunta' obrigatório"})
+            return
+
+        from models.model import responder
+
+        try:
+            resposta, sugestoes = responder(pergunta)
+        except Exception as e:
+            print(f"[ERRO] Worker {os.getpid()}: falha ao responder '{pergunta}': {e}")
+            self._send_json(500, {"erro": "falha ao gerar a resposta", "worker": os.getpid()})
+            return
+        self._send_json(200, {"resposta": resposta, "sugestoes": sugestoes, "worker": os.getpid()})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def smoke_check():
+    """Roda uma inferência de cada artefato compartilhado. Chamada no worker, logo
+    após o fork: se o TensorFlow/PyTorch/FAISS não funcionarem no processo
+    filho, o problema aparece aqui (erro ou travamento) e não numa requisição."""
+    from models.artifacts import current_artifacts
+
+    bundle = current_artifacts()
+    if bundle.model is not None:
+        from training.utils import texto_para_sequencia
+
+        bundle.model.predict(texto_para_sequencia(bundle.tokenizer, "teste"), verbose=0)
+    if bundle.rag_enabled:
+        from rag.query import search_shards
+
+        search_shards(bundle.rag_shards, "teste", k=1)
+
+
+def _run_worker(sock: socket.socket, ready_fd: int):
+    """Loop de um worker: atende requisições no socket herdado do supervisor."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # o supervisor coordena o encerramento
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    try:
+        from models.artifacts import reload_artifacts
+
+        # carrega só o classificador; os shards do RAG vêm do supervisor
+        reload_artifacts()
+        smoke_check()
+    except Exception as e:
+        print(f"[ERRO] Worker {os.getpid()}: inferência de teste falhou após o fork: {e}")
+        os._exit(_SMOKE_EXIT)
+    os.write(ready_fd, f"{os.getpid()}\n".encode("ascii"))
+    os.close(ready_fd)
+    server = HTTPServer(sock.getsockname()[:2], _Handler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def preload():
+    """Carrega no supervisor tudo que os workers vão compartilhar, exceto o
+    classificador Keras. Nenhuma inferência é feita aqui: pools de threads
+    (TensorFlow, OpenMP do FAISS, o executor de shards do RAG) criados antes do
+    fork não existiriam nos workers."""
+    from models.artifacts import reload_artifacts
+
+    # antes de importar models.model, que carregaria o bundle completo
+    bundle = reload_artifacts(classifier=False)
+    import models.model  # noqa: F401  (prompt e provedor de LLM)
+    if bundle.rag_enabled:
+        from rag.query import get_model
+
+        get_model()
+    return bundle
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 2, report_after: float = 5.0):
+    if not hasattr(os, "fork"):
+        raise RuntimeError("O modo supervisor exige fork (Linux/macOS).")
+
+    print("[INFO] Carregando artefatos no supervisor...")
+    bundle = preload()
+    preload_rss = _memory_kb(os.getpid())["rss"]
+    print(f"[INFO] Artefatos compartilhados carregados (RAG versão {bundle.rag_version}); o classificador é carregado em cada worker.")
+
+    sock = socket.create_server((host, port), backlog=128)
+    # move os objetos já carregados para fora do GC, que senão tocaria nas páginas
+    # compartilhadas e forçaria cópias em todos os workers
+    gc.collect()
+    gc.freeze()
+
+    pids = {}
+    iniciando = {}  # pid -> prazo para concluir a inferência de teste
+    ready_r, ready_w = os.pipe()
+    os.set_blocking(ready_r, False)
+    pendente = b""
+
+    def _spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            _run_worker(sock, ready_w)
+        pids[pid] = (slot, time.monotonic())
+        iniciando[pid] = time.monotonic() + _SMOKE_TIMEOUT
+
+    for slot in range(workers):
+        _spawn(slot)
+    print(f"[INFO] {workers} workers iniciando em http://{host}:{port} (supervisor pid {os.getpid()})")
+
+    parar = []
+    relatorio = []
+    signal.signal(signal.SIGTERM, lambda *_: parar.append(True))
+    signal.signal(signal.SIGINT, lambda *_: parar.append(True))
+    signal.signal(signal.SIGUSR1, lambda *_: relatorio.append(True))
+
+    inicio = time.monotonic()
+    erro = None
+    while not parar:
+        if select.select([ready_r], [], [], 0)[0]:
+            pendente += os.read(ready_r, 4096)
+            *prontos, pendente = pendente.split(b"\n")
+            for linha in prontos:
+                iniciando.pop(int(linha), None)
+        atrasados = [pid for pid, prazo in iniciando.items() if time.monotonic() > prazo]
+        if atrasados:
+            erro = (f"worker não concluiu a inferência de teste em {_SMOKE_TIMEOUT:.0f}s após o fork "
+                    "(TensorFlow/PyTorch travados no processo filho?)")
+            break
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = 0, 0
+        if pid and pid in pids:
+            if pid in iniciando:
+                # falhou antes de ficar pronto: recriar repetiria o mesmo erro
+                code = os.waitstatus_to_exitcode(status)
+                pids.pop(pid)
+                erro = f"worker (pid {pid}) terminou durante a inferência de teste (código {code})"
+                break
+            slot, iniciado = pids.pop(pid)
+            print(f"[AVISO] Worker {slot} (pid {pid}) terminou com status {status}; recriando.")
+            if time.monotonic() - iniciado < _RESTART_BACKOFF:
+                time.sleep(_RESTART_BACKOFF)
+            _spawn(slot)
+            continue
+        if report_after is not None and time.monotonic() - inicio >= report_after:
+            report_after = None
+            relatorio.append(True)
+        if relatorio:
+            relatorio.clear()
+            memory_report(os.getpid(), list(pids), preload_rss)
+        time.sleep(0.2)
+
+    print("[INFO] Encerrando workers...")
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL if pid in iniciando else signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in list(pids):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    os.close(ready_r)
+    os.close(ready_w)
+    if erro:
+        raise RuntimeError(f"Modo supervisor abortado: {erro}. Rode processos independentes (sem pre-fork) neste ambiente.")
+
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    p.add_argument("--report-after", type=float, default=5.0, dest="report_after", help="segundos até o primeiro relatório de memória")
+    args = p.parse_args()
+    serve(args.host, args.port, args.workers, args.report_after)
@@ -0,0 +1,105 @@
+"""Recarga dos artefatos (models/artifacts.py) com índices FAISS pequenos."""
+
+import json
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+import models.artifacts as artifacts
+import rag.query
+
+
+def _gravar_indice(pasta, n, n_metas=None):
+    os.makedirs(pasta, exist_ok=True)
+    index = faiss.IndexFlatIP(4)
+    index.add(np.random.default_rng(n).random((n, 4), dtype=np.float32))
+    faiss.write_index(index, os.path.join(pasta, "index.faiss"))
+    metas = [{"path": f"a{i}.py", "text": f"chunk {i}"} for i in range(n if n_metas is None else n_metas)]
+    with open(os.path.join(pasta, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(metas, f)
+
+
+@pytest.fixture
+def art(tmp_path, monkeypatch):
+    """Artefatos em tmp_path, sem classificador e sem modelo de embeddings."""
+    shards = tmp_path / "shards"
+    monkeypatch.setattr(artifacts, "SHARDS_DIR", str(shards))
+    monkeypatch.setattr(artifacts, "RAG_FILES", (str(tmp_path / "index.faiss"), str(tmp_path / "meta.json")))
+    monkeypatch.setattr(artifacts, "CLASSIFIER_FILES", (str(tmp_path / "model.h5"),))
+    monkeypatch.setattr(artifacts, "_current", None)
+    monkeypatch.setattr(artifacts, "_listeners", [])
+    monkeypatch.setattr(rag.query, "get_model", lambda *a, **k: None)
+    return shards
+
+
+def test_reindexar_um_shard_so_recarrega_ele(art):
+    _gravar_indice(art / "repo-a", 5)
+    _gravar_indice(art / "repo-b", 7)
+    v1 = artifacts.reload_artifacts()
+    assert sorted(v1.rag_shards) == ["repo-a", "repo-b"]
+
+    _gravar_indice(art / "repo-b", 9)
+    v2 = artifacts.reload_artifacts()
+    assert v2.rag_version != v1.rag_version
+    assert v2.rag_shards["repo-a"] is v1.rag_shards["repo-a"]
+    assert v2.rag_shards["repo-b"] is not v1.rag_shards["repo-b"]
+    assert v2.rag_shards["repo-b"].index.ntotal == 9
+
+    # nada mudou: mesmo bundle
+    assert artifacts.reload_artifacts() is v2
+
+
+def test_shard_novo_e_shard_removido(art):
+    _gravar_indice(art / "repo-a", 5)
+    v1 = artifacts.reload_artifacts()
+    _gravar_indice(art / "repo-c", 3)
+    v2 = artifacts.reload_artifacts()
+    assert v2.rag_shards["repo-a"] is v1.rag_shards["repo-a"]
+    assert "repo-c" in v2.rag_shards
+
+    os.remove(art / "repo-a" / "meta.json")
+    v3 = artifacts.reload_artifacts()
+    assert sorted(v3.rag_shards) == ["repo-c"]
+
+
+def test_indice_pela_metade_mantem_a_versao_ativa(art):
+    _gravar_indice(art / "repo-a", 5)
+    v1 = artifacts.reload_artifacts()
+
+    # index.faiss novo, meta.json ainda antigo
+    _gravar_indice(art / "repo-a", 8, n_metas=5)
+    with pytest.raises(ValueError, match="inconsistente"):
+        artifacts.reload_artifacts()
+    assert artifacts.current_artifacts() is v1
+
+    _gravar_indice(art / "repo-a", 8)
+    assert artifacts.reload_artifacts().rag_shards["repo-a"].index.ntotal == 8
+
+
+def test_primeira_carga_inconsistente_desativa_o_rag(art):
+    _gravar_indice(art / "repo-a", 5, n_metas=4)
+    bundle = artifacts.reload_artifacts()
+    assert not bundle.rag_enabled
+
+    _gravar_indice(art / "repo-a", 5)
+    assert artifacts.reload_artifacts().rag_enabled
+
+
+def test_sem_classificador_e_depois_so_o_classificador(art, monkeypatch):
+    """Fluxo do modo supervisor: RAG antes do fork, classificador no worker."""
+    carregados = []
+
+    def _classificador():
+        carregados.append(True)
+        return "modelo", "tokenizer", ["resposta"]
+
+    monkeypatch.setattr(artifacts, "_load_classifier", _classificador)
+    _gravar_indice(art / "repo-a", 5)
+    supervisor = artifacts.reload_artifacts(classifier=False)
+    assert supervisor.model is None and not carregados
+
+    worker = artifacts.reload_artifacts()
+    assert worker.model == "modelo" and len(carregados) == 1
+    assert worker.rag_shards["repo-a"] is supervisor.rag_shards["repo-a"]
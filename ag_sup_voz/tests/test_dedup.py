@@ -0,0 +1,40 @@
+"""Remoção de chunks quase duplicados (MinHash + LSH)."""
+
+from rag.dedup import dedup_chunks
+
+BASE = ("def carregar_config(caminho):\n"
+        "    with open(caminho) as f:\n"
+        "        dados = json.load(f)\n"
+        "    if 'porta' not in dados:\n"
+        "        dados['porta'] = 8000\n"
+        "    return validar(dados, esquema=ESQUEMA_PADRAO, estrito=True)\n")
+OUTRO = ("class Fila:\n"
+         "    def __init__(self):\n"
+         "        self.itens = deque()\n"
+         "    def publicar(self, evento):\n"
+         "        self.itens.append(evento)\n"
+         "        return len(self.itens)\n")
+
+
+def test_quase_copias_viram_alias_e_textos_distintos_ficam():
+    quase = "# vendorizado\n" + BASE
+    metas = [
+        {"path": "src/config.py", "chunk_id": 0},
+        {"path": "vendor/lib/config.py", "chunk_id": 0},
+        {"path": "src/fila.py", "chunk_id": 0},
+    ]
+    metas, texts, removidos = dedup_chunks(metas, [BASE, quase, OUTRO])
+
+    assert removidos == 1
+    assert texts == [BASE, OUTRO]
+    assert metas[0]["aliases"] == ["vendor/lib/config.py"]
+    assert "aliases" not in metas[1]
+
+
+def test_duplicata_no_mesmo_arquivo_nao_vira_alias():
+    metas = [{"path": "src/config.py", "chunk_id": 0}, {"path": "src/config.py", "chunk_id": 1}]
+    metas, texts, removidos = dedup_chunks(metas, [BASE, BASE])
+
+    assert removidos == 1
+    assert len(texts) == 1
+    assert "aliases" not in metas[0]
@@ -0,0 +1,71 @@
+"""OnnxEmbedder.encode com um modelo ONNX mínimo (tabela de embeddings)."""
+
+import json
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+tokenizers = pytest.importorskip("tokenizers")
+
+from rag.embeddings import OnnxEmbedder, _ONNX_FILES
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "abrir": 2, "tela": 3, "de": 4, "login": 5, "salvar": 6}
+TABELA = np.random.default_rng(0).normal(size=(len(VOCAB), 4)).astype(np.float32)
+
+
+@pytest.fixture
+def embedder(tmp_path):
+    """Exportação falsa: o "modelo" só troca cada token pela sua linha na tabela."""
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    grafo = helper.make_graph(
+        [helper.make_node("Gather", ["tabela", "input_ids"], ["last_hidden_state"])],
+        "tabela_de_embeddings",
+        [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["lote", "seq"])],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["lote", "seq", 4])],
+        [numpy_helper.from_array(TABELA, "tabela")],
+    )
+    modelo = helper.make_model(grafo, opset_imports=[helper.make_opsetid("", 17)])
+    modelo.ir_version = 8
+    onnx.save(modelo, str(tmp_path / _ONNX_FILES["onnx"]))
+
+    tok = Tokenizer(models.WordLevel(VOCAB, unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.save(str(tmp_path / "tokenizer.json"))
+    with open(tmp_path / "embedder.json", "w", encoding="utf-8") as f:
+        json.dump({"model_name": "teste", "dim": 4, "max_seq_length": 16, "pad_token": "[PAD]", "normalize": False}, f)
+    return OnnxEmbedder(str(tmp_path))
+
+
+def _media(texto):
+    return TABELA[[VOCAB.get(p, 1) for p in texto.split()]].mean(axis=0)
+
+
+def test_mean_pooling_ignora_o_padding(embedder):
+    # no mesmo lote, o texto curto recebe [PAD], que não pode entrar na média
+    emb = embedder.encode(["login", "abrir tela de login"])
+    np.testing.assert_allclose(emb[0], _media("login"), rtol=1e-5)
+    np.testing.assert_allclose(emb[1], _media("abrir tela de login"), rtol=1e-5)
+
+
+def test_lotes_por_tamanho_mantem_a_ordem_original(embedder, monkeypatch):
+    textos = ["abrir tela de login salvar", "login", "abrir tela de", "salvar", "tela de"]
+    lotes = []
+    original = embedder._encode_batch
+    monkeypatch.setattr(embedder, "_encode_batch", lambda t: lotes.append(t) or original(t))
+
+    emb = embedder.encode(textos, batch_size=2)
+    # cada lote junta textos de tamanho parecido
+    assert lotes == [["login", "salvar"], ["tela de", "abrir tela de"], ["abrir tela de login salvar"]]
+    for texto, vetor in zip(textos, emb):
+        np.testing.assert_allclose(vetor, _media(texto), rtol=1e-5)
+
+
+def test_string_unica_retorna_um_vetor(embedder):
+    emb = embedder.encode("abrir tela")
+    assert emb.shape == (4,)
+    np.testing.assert_allclose(emb, _media("abrir tela"), rtol=1e-5)
+    assert embedder.encode([]).shape == (0, 4)
@@ -0,0 +1,105 @@
+"""Pipeline de voz dirigido por WAV, com um reconhecedor falso."""
+
+import threading
+import time
+import wave
+
+import numpy as np
+
+from services.get_audio import FRAME_MS, SAMPLE_RATE, StreamingListener, ouvir, segment_utterances, wav_frames
+
+
+def _escrever_wav(path, trechos):
+    """trechos: lista de (segundos, tem_voz). Voz = tom de 440 Hz; silêncio = ruído baixo."""
+    rng = np.random.default_rng(0)
+    partes = []
+    for segundos, voz in trechos:
+        n = int(SAMPLE_RATE * segundos)
+        if voz:
+            t = np.arange(n) / SAMPLE_RATE
+            partes.append(8000 * np.sin(2 * np.pi * 440 * t))
+        else:
+            partes.append(rng.normal(scale=30, size=n))
+    pcm = np.concatenate(partes).astype(np.int16).tobytes()
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(pcm)
+
+
+class _Reconhecedor:
+    """Devolve a duração da fala, para identificar cada uma."""
+
+    def __init__(self):
+        self.chamadas = 0
+
+    def recognize(self, pcm, sample_rate):
+        self.chamadas += 1
+        return f"fala de {round(len(pcm) / 2 / sample_rate, 1)}s"
+
+
+# silêncio, fala de 1s, silêncio, fala de 2s, silêncio, fala de 0.5s, silêncio
+TRECHOS = [(0.5, False), (1.0, True), (1.0, False), (2.0, True), (1.0, False), (0.5, True), (1.0, False)]
+
+
+def test_segmenta_e_reconhece_em_ordem(tmp_path):
+    wav = tmp_path / "falas.wav"
+    _escrever_wav(wav, TRECHOS)
+    rate, frames = wav_frames(str(wav))
+    textos = list(StreamingListener(frames, _Reconhecedor(), sample_rate=rate))
+    assert len(textos) == 3
+    # cada fala inclui o pre-roll (0.3s) e o silêncio que a encerra (0.6s)
+    assert textos == ["fala de 1.8s", "fala de 2.8s", "fala de 1.3s"]
+
+
+def test_pausa_descarta_a_fala_do_proprio_agente(tmp_path):
+    wav = tmp_path / "falas.wav"
+    _escrever_wav(wav, TRECHOS)
+    rate, frames = wav_frames(str(wav))
+    reconhecedor = _Reconhecedor()
+    listener = None
+
+    # simula o agente começando a falar no meio da segunda fala (2.8s) e
+    # terminando depois dela (5.0s): esse áudio não pode virar pergunta
+    def _com_reproducao():
+        for i, frame in enumerate(frames):
+            t = i * FRAME_MS / 1000
+            if t >= 2.8 and not listener.paused and t < 5.0:
+                listener.pause()
+            elif t >= 5.0 and listener.paused:
+                listener.resume()
+            yield frame
+
+    listener = StreamingListener(_com_reproducao(), reconhecedor, sample_rate=rate)
+    textos = list(listener)
+    assert len(textos) == 2
+    assert reconhecedor.chamadas == 2
+    assert textos == ["fala de 1.8s", "fala de 1.3s"]
+
+
+def test_quadro_none_reinicia_a_segmentacao():
+    voz = (8000 * np.sin(np.arange(480) / 5)).astype(np.int16).tobytes()
+    silencio = bytes(960)
+    frames = [silencio] * 10 + [voz] * 20 + [None] + [silencio] * 30
+    assert list(segment_utterances(frames, frame_ms=FRAME_MS)) == []
+
+
+def test_ouvir_wav_pausado_espera_o_resume(tmp_path):
+    """No agente, o listener começa pausado (boas-vindas) e é pausado a cada
+    fala: com um WAV, o áudio tem de esperar em vez de ser descartado."""
+    wav = tmp_path / "falas.wav"
+    _escrever_wav(wav, TRECHOS)
+    reconhecedor = _Reconhecedor()
+    listener = ouvir(reconhecedor, wav_path=str(wav), paused=True)
+    time.sleep(0.3)
+    assert reconhecedor.chamadas == 0  # nada lido durante a pausa
+
+    listener.resume()
+    textos = []
+    for texto in listener:
+        textos.append(texto)
+        # o agente fala a resposta: pausa e retoma, como em main.py
+        listener.pause()
+        threading.Timer(0.1, listener.resume).start()
+    assert textos == ["fala de 1.8s", "fala de 2.8s", "fala de 1.3s"]
@@ -0,0 +1,70 @@
+"""Chunking de arquivos Python por nó da AST."""
+
+from rag.filters import ChunkAttributes
+from rag.index import chunk_code_intelligently, chunk_with_kinds
+
+CODIGO = '''"""Módulo de exemplo."""
+import os
+
+LIMITE = 3
+
+
+@staticmethod
+def ajuda():
+    return "ajuda"
+
+
+class Evento:
+    def publicar(self):
+        return True
+
+    async def cancelar(self):
+        return False
+'''
+
+
+def test_python_vira_classes_funcoes_e_modulo():
+    chunks = chunk_with_kinds("app/eventos.py", CODIGO)
+    tipos = [k for _, k in chunks]
+    assert tipos.count("module") == 1
+    assert tipos.count("class") == 1
+    assert tipos.count("function") == 3
+
+    por_inicio = {c.splitlines()[0].strip(): k for c, k in chunks}
+    assert por_inicio["@staticmethod"] == "function"  # decorador incluído
+    assert por_inicio["class Evento:"] == "class"
+    assert por_inicio["async def cancelar(self):"] == "function"
+
+    modulo = next(c for c, k in chunks if k == "module")
+    assert "LIMITE = 3" in modulo and "def " not in modulo
+
+    assert chunk_code_intelligently("app/eventos.py", CODIGO) == [c for c, _ in chunks]
+
+
+def test_erro_de_sintaxe_usa_o_arquivo_inteiro():
+    assert chunk_with_kinds("quebrado.py", "def (:\n") == [("def (:\n", "module")]
+
+
+def test_filtro_por_tipo_encontra_funcoes():
+    metas = [{"path": "app/eventos.py", "text": c, "kind": k} for c, k in chunk_with_kinds("app/eventos.py", CODIGO)]
+    metas.append({"path": "README.md", "text": "# Título", "kind": "section"})
+    attrs = ChunkAttributes.from_metas(metas)
+    assert int(attrs.mask({"kind": "function"}).sum()) == 3
+    assert int(attrs.mask({"kind": "class", "ext": ".py"}).sum()) == 1
+
+
+def test_filtros_consideram_os_aliases(tmp_path):
+    metas = [
+        {"path": "src/config.py", "kind": "function", "aliases": ["vendor/lib/config.py", "docs/config.txt"]},
+        {"path": "src/fila.py", "kind": "class"},
+        {"path": "vendor/lib/util.py", "kind": "function"},
+    ]
+    attrs = ChunkAttributes.from_metas(metas)
+    arquivo = tmp_path / "index.attrs.npz"
+    attrs.save(str(arquivo))
+    for a in (attrs, ChunkAttributes.load(str(arquivo))):
+        assert a.mask({"path_prefix": "vendor/"}).tolist() == [True, False, True]
+        assert a.mask({"ext": ".txt"}).tolist() == [True, False, False]
+        # só é excluído quando todas as cópias são excluídas
+        assert a.mask({"exclude_path_prefix": "vendor/"}).tolist() == [True, True, False]
+        assert a.mask({"exclude_path_prefix": ["src/", "vendor/", "docs/"]}).tolist() == [False, False, False]
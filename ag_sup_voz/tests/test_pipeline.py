@@ -0,0 +1,67 @@
+"""Retomada do pipeline em lote (rag/pipeline.py) sem índice nem LLM reais."""
+
+import json
+
+import pytest
+
+import rag.pipeline as pipeline
+
+
+@pytest.fixture
+def sem_busca_nem_llm(monkeypatch):
+    monkeypatch.setattr(pipeline, "get_model", lambda: None)
+    monkeypatch.setattr(pipeline, "search_shards_batch", lambda shards, qs, **kw: [[{"path": "a.py", "text": q}] for q in qs])
+    monkeypatch.setattr(pipeline, "call_llm", lambda q, chunks: f"resposta: {q}")
+    monkeypatch.setattr(pipeline, "_get_client", lambda: object())
+
+
+def _escrever_perguntas(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, n + 1):
+            f.write(json.dumps({"id": str(i), "question": f"pergunta {i}"}) + "\n")
+
+
+def test_retomada_corrige_linha_truncada_e_refaz_erros(tmp_path, sem_busca_nem_llm):
+    entrada, saida = tmp_path / "q.jsonl", tmp_path / "r.jsonl"
+    _escrever_perguntas(entrada, 4)
+    with open(saida, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "1", "answer": "ok"}) + "\n")
+        f.write(json.dumps({"id": "2", "answer": None, "error": "timeout"}) + "\n")
+        f.write('{"id": "3", "q')  # escrita interrompida
+
+    stats = pipeline.run_batch(str(entrada), str(saida), shards={}, rate=0)
+
+    assert stats["skipped"] == 1
+    assert stats["questions"] == 3
+    linhas = saida.read_text(encoding="utf-8").splitlines()
+    registros = [json.loads(l) for l in linhas]  # todas as linhas são JSON válido
+    assert sorted(r["id"] for r in registros) == ["1", "2", "3", "4"]
+    assert not any("error" in r for r in registros)
+
+
+def test_arquivo_sem_quebra_de_linha_final(tmp_path, sem_busca_nem_llm):
+    entrada, saida = tmp_path / "q.jsonl", tmp_path / "r.jsonl"
+    _escrever_perguntas(entrada, 2)
+    saida.write_text(json.dumps({"id": "1", "answer": "ok"}), encoding="utf-8")
+
+    pipeline.run_batch(str(entrada), str(saida), shards={}, rate=0)
+
+    assert [json.loads(l)["id"] for l in saida.read_text(encoding="utf-8").splitlines()] == ["1", "2"]
+
+
+def test_sem_llm_grava_erro_e_refaz_ao_retomar(tmp_path, sem_busca_nem_llm, monkeypatch):
+    entrada, saida = tmp_path / "q.jsonl", tmp_path / "r.jsonl"
+    _escrever_perguntas(entrada, 3)
+
+    monkeypatch.setattr(pipeline, "_get_client", lambda: None)
+    stats = pipeline.run_batch(str(entrada), str(saida), shards={}, rate=0)
+    assert stats["errors"] == 3
+    registros = [json.loads(l) for l in saida.read_text(encoding="utf-8").splitlines()]
+    assert all(r["error"] == pipeline.LLM_UNAVAILABLE for r in registros)
+
+    # com o LLM configurado, a retomada refaz todas
+    monkeypatch.setattr(pipeline, "_get_client", lambda: object())
+    stats = pipeline.run_batch(str(entrada), str(saida), shards={}, rate=0)
+    assert stats["skipped"] == 0 and stats["questions"] == 3
+    registros = [json.loads(l) for l in saida.read_text(encoding="utf-8").splitlines()]
+    assert len(registros) == 3 and not any("error" in r for r in registros)
@@ -0,0 +1,122 @@
+"""Atualização da base de QA contra uma API local (http.server)."""
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import data.qa_data as qa_data
+
+
+class _Api:
+    """Estado da API falsa: versão atual, pares e o delta a partir da versão anterior."""
+
+    def __init__(self):
+        self.etag = '"v1"'
+        self.last_modified = "Mon, 19 Oct 2026 10:00:00 GMT"
+        self.pares = {"oi": "Olá!", "tchau": "Até mais!"}
+        self.delta = None  # (etag_base, payload)
+        self.requisicoes = []
+
+
+@pytest.fixture
+def api():
+    estado = _Api()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            estado.requisicoes.append(dict(self.headers))
+            if self.headers.get("If-None-Match") == estado.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            if estado.delta and self.headers.get("A-IM") == "qa-delta" and self.headers.get("If-None-Match") == estado.delta[0]:
+                payload = estado.delta[1]
+            else:
+                payload = {"qa_pairs": estado.pares}
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("ETag", estado.etag)
+            self.send_header("Last-Modified", estado.last_modified)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    estado.url = f"http://127.0.0.1:{server.server_address[1]}/qa"
+    yield estado
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def qa(tmp_path, monkeypatch):
+    """Isola o módulo: cache em tmp_path, base embutida e sem ouvintes."""
+    monkeypatch.setattr(qa_data, "_CACHE_FILE", str(tmp_path / "qa_cache.json"))
+    monkeypatch.setattr(qa_data, "qa_pairs", dict(qa_data._default_qa))
+    monkeypatch.setattr(qa_data, "_listeners", [])
+    monkeypatch.setattr(qa_data, "_validators", {})
+    return qa_data
+
+
+def _ler_cache(qa):
+    with open(qa._CACHE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_200_grava_cache_e_depois_304(api, qa, tmp_path):
+    assert qa.refresh_qa(api.url) == api.pares
+    assert qa.get_qa_pairs() == api.pares
+
+    cache = _ler_cache(qa)
+    assert cache == {"qa_pairs": api.pares, "etag": '"v1"', "last_modified": api.last_modified}
+    assert [p.name for p in tmp_path.iterdir()] == ["qa_cache.json"]  # sem temporários
+
+    chamados = []
+    qa.add_listener(chamados.append)
+    assert qa.refresh_qa(api.url) == api.pares
+    assert api.requisicoes[-1]["If-None-Match"] == '"v1"'
+    assert api.requisicoes[-1]["If-Modified-Since"] == api.last_modified
+    assert chamados == []  # 304: nada mudou
+
+
+def test_delta_aplica_upsert_e_remove_e_avisa_ouvintes(api, qa):
+    qa.refresh_qa(api.url)
+    importado = qa.qa_pairs  # como `from data.qa_data import qa_pairs`
+    chamados = []
+    qa.add_listener(chamados.append)
+
+    api.etag = '"v2"'
+    api.delta = ('"v1"', {"delta": True, "upsert": {"bom dia": "Bom dia!", "oi": "Oi!"}, "remove": ["tchau"]})
+    esperado = {"oi": "Oi!", "bom dia": "Bom dia!"}
+
+    assert qa.refresh_qa(api.url) == esperado
+    assert chamados == [esperado]
+    assert importado == {"oi": "Olá!", "tchau": "Até mais!"}  # troca, não mutação
+    assert _ler_cache(qa)["qa_pairs"] == esperado
+    assert _ler_cache(qa)["etag"] == '"v2"'
+
+
+def test_carga_inicial_le_o_cache(qa):
+    with open(qa._CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"qa_pairs": {"oi": "Olá!"}, "etag": '"v9"'}, f)
+    assert qa._initial_load() == {"oi": "Olá!"}
+    assert qa._validators == {"etag": '"v9"'}
+
+    # formato antigo: dicionário simples de pares
+    with open(qa._CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"oi": "Olá!"}, f)
+    assert qa._load_cache() == ({"oi": "Olá!"}, {})
+
+
+def test_api_fora_do_ar_mantem_os_pares(qa):
+    antes = qa.qa_pairs
+    assert qa.refresh_qa("http://127.0.0.1:9/qa") is antes
+    assert not os.path.exists(qa._CACHE_FILE)
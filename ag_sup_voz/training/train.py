@@ -1,45 +1,198 @@
 """
 Arquivo para treinar um modelo de linguagem simples
-usando perguntas e respostas (QA) pré-definidas e salvar os artefatos necessários
+usando perguntas e respostas (QA) pré-definidas e salvar os artefatos necessários.
+
+O treino é identificado por um hash dos pares de QA e dos hiperparâmetros
+(gravado em `models/train_manifest.json`): se nada mudou, é pulado. Quando
+apenas alguns pares foram adicionados, parte dos pesos do modelo anterior
+(warm start). Usa `tf.data` e early stopping em vez de um número fixo de épocas.
 """
 
 import json
-import numpy as np
-import tensorflow as tf
-import sys
+import hashlib
 import os
+import sys
+import time
+
+import numpy as np
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from data.qa_data import qa_pairs
-from training.utils import criar_tokenizer, texto_para_sequencia
-
-# Preparar tokenizer e dados
-tokenizer = criar_tokenizer(qa_pairs)
-perguntas = list(qa_pairs.keys())
-respostas = list(qa_pairs.values())
-X = np.array([texto_para_sequencia(tokenizer, p)[0] for p in perguntas])
-y = np.arange(len(respostas))
-
-# Modelo simples (mesma arquitetura usada em model.py)
-model = tf.keras.Sequential([
-    tf.keras.layers.Embedding(input_dim=len(tokenizer.word_index) + 1, output_dim=8, input_length=10),
-    tf.keras.layers.GlobalAveragePooling1D(),
-    tf.keras.layers.Dense(16, activation='relu'),
-    tf.keras.layers.Dense(len(respostas), activation='softmax')
-])
-
-model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
-
-print("Iniciando treino do modelo...")
-model.fit(X, y, epochs=200, verbose=1)
-
-# Salvar artefatos
-print("Salvando modelo e tokenizer...")
-model.save("models/model.h5")
-with open("models/tokenizer.json", "w", encoding="utf-8") as f:
-    f.write(tokenizer.to_json())
-with open("data/respostas.json", "w", encoding="utf-8") as f:
-    json.dump(respostas, f, ensure_ascii=False)
-
-print("Treino concluído. Arquivos gerados: models/model.h5, models/tokenizer.json, data/respostas.json")
+from data.qa_data import refresh_qa
+from models.artifacts import MODEL_PATH, TOKENIZER_PATH, RESPOSTAS_PATH
+from training.utils import criar_tokenizer, textos_para_sequencias
+
+MANIFEST_PATH = "models/train_manifest.json"
+
+DEFAULT_HPARAMS = {
+    "max_len": 10,
+    "embedding_dim": 8,
+    "hidden_units": 16,
+    "batch_size": 32,
+    "max_epochs": 200,
+    "patience": 5,
+    "min_delta": 1e-3,
+    "target_loss": 0.05,
+}
+
+# Fração máxima de pares novos (em relação ao treino anterior) para usar warm start
+WARM_START_MAX_NEW_RATIO = 0.2
+
+
+def _hash_treino(qa_pairs: dict, hparams: dict) -> str:
+    """Hash dos pares (na ordem, pois definem as classes) e dos hiperparâmetros."""
+    payload = json.dumps({"qa": list(qa_pairs.items()), "hparams": hparams}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            if isinstance(data, dict):
+                return data
+    except Exception:
+        pass
+    return None
+
+
+def _write_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def construir_modelo(vocab_size: int, n_classes: int, hparams: dict):
+    """Modelo simples de classificação de intenção."""
+    import tensorflow as tf
+
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(hparams["max_len"],)),
+        tf.keras.layers.Embedding(input_dim=vocab_size, output_dim=hparams["embedding_dim"]),
+        tf.keras.layers.GlobalAveragePooling1D(),
+        tf.keras.layers.Dense(hparams["hidden_units"], activation='relu'),
+        tf.keras.layers.Dense(n_classes, activation='softmax')
+    ])
+    model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def _warm_start(model, old_model, old_tokenizer, tokenizer, old_perguntas, perguntas):
+    """Copia os pesos do modelo anterior para as palavras e classes que já existiam."""
+    emb_new = model.layers[0].get_weights()[0]
+    emb_old = old_model.layers[0].get_weights()[0]
+    for palavra, i in tokenizer.word_index.items():
+        j = old_tokenizer.word_index.get(palavra)
+        if j is not None and j < len(emb_old) and i < len(emb_new):
+            emb_new[i] = emb_old[j]
+    model.layers[0].set_weights([emb_new])
+
+    model.layers[2].set_weights(old_model.layers[2].get_weights())
+
+    W, b = model.layers[3].get_weights()
+    W_old, b_old = old_model.layers[3].get_weights()
+    old_idx = {p: j for j, p in enumerate(old_perguntas)}
+    for i, p in enumerate(perguntas):
+        j = old_idx.get(p)
+        if j is not None:
+            W[:, i] = W_old[:, j]
+            b[i] = b_old[j]
+    model.layers[3].set_weights([W, b])
+
+
+def _pode_warm_start(manifest, hparams: dict, perguntas: list) -> bool:
+    if not manifest or manifest.get("hparams") != hparams:
+        return False
+    if not (os.path.exists(MODEL_PATH) and os.path.exists(TOKENIZER_PATH)):
+        return False
+    old_perguntas = manifest.get("perguntas") or []
+    if not old_perguntas or not set(old_perguntas) <= set(perguntas):
+        return False
+    novos = len(perguntas) - len(old_perguntas)
+    return novos <= max(1, int(len(old_perguntas) * WARM_START_MAX_NEW_RATIO))
+
+
+def train(qa_pairs: dict = None, hparams: dict = None, force: bool = False, warm_start: bool = True, verbose: int = 1) -> bool:
+    """Treina e salva os artefatos. Retorna False se o treino foi pulado.
+    Sem `qa_pairs`, consulta a QA_API_URL (se configurada) antes de treinar."""
+    if qa_pairs is None:
+        # a importação de qa_data não acessa a rede (só cache/dados embutidos)
+        qa_pairs = refresh_qa()
+    hparams = dict(DEFAULT_HPARAMS, **(hparams or {}))
+    digest = _hash_treino(qa_pairs, hparams)
+    manifest = _load_manifest()
+
+    artefatos_ok = all(os.path.exists(p) for p in (MODEL_PATH, TOKENIZER_PATH, RESPOSTAS_PATH))
+    if not force and artefatos_ok and manifest and manifest.get("hash") == digest:
+        print("Pares de QA e hiperparâmetros não mudaram; treino pulado.")
+        return False
+
+    import tensorflow as tf
+    from tensorflow.keras.preprocessing.text import tokenizer_from_json
+
+    # Preparar tokenizer e dados
+    tokenizer = criar_tokenizer(qa_pairs)
+    perguntas = list(qa_pairs.keys())
+    respostas = list(qa_pairs.values())
+    X = textos_para_sequencias(tokenizer, perguntas, max_len=hparams["max_len"])
+    y = np.arange(len(respostas))
+
+    dataset = (
+        tf.data.Dataset.from_tensor_slices((X, y))
+        .cache()
+        .shuffle(len(perguntas), reshuffle_each_iteration=True)
+        .batch(hparams["batch_size"])
+        .prefetch(tf.data.AUTOTUNE)
+    )
+
+    model = construir_modelo(len(tokenizer.word_index) + 1, len(respostas), hparams)
+
+    if warm_start and not force and _pode_warm_start(manifest, hparams, perguntas):
+        old_model = tf.keras.models.load_model(MODEL_PATH)
+        with open(TOKENIZER_PATH, "r", encoding="utf-8") as f:
+            old_tokenizer = tokenizer_from_json(f.read())
+        _warm_start(model, old_model, old_tokenizer, tokenizer, manifest["perguntas"], perguntas)
+        print(f"Warm start a partir do modelo anterior ({len(perguntas) - len(manifest['perguntas'])} pares novos).")
+
+    class _StopAtLoss(tf.keras.callbacks.Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            if logs and logs.get("loss", float("inf")) <= hparams["target_loss"]:
+                self.model.stop_training = True
+
+    callbacks = [
+        tf.keras.callbacks.EarlyStopping(monitor="loss", min_delta=hparams["min_delta"], patience=hparams["patience"], restore_best_weights=True),
+        _StopAtLoss(),
+    ]
+
+    print("Iniciando treino do modelo...")
+    inicio = time.perf_counter()
+    history = model.fit(dataset, epochs=hparams["max_epochs"], callbacks=callbacks, verbose=verbose)
+    print(f"Treino concluído em {len(history.epoch)} épocas ({time.perf_counter() - inicio:.1f}s).")
+
+    # Salvar artefatos (cada arquivo é substituído de forma atômica)
+    print("Salvando modelo e tokenizer...")
+    tmp_model = os.path.join(os.path.dirname(MODEL_PATH), ".model.tmp.h5")
+    model.save(tmp_model)
+    os.replace(tmp_model, MODEL_PATH)
+    _write_atomic(TOKENIZER_PATH, tokenizer.to_json())
+    _write_atomic(RESPOSTAS_PATH, json.dumps(respostas, ensure_ascii=False))
+    _write_atomic(MANIFEST_PATH, json.dumps({"hash": digest, "hparams": hparams, "perguntas": perguntas}, ensure_ascii=False))
+
+    print(f"Arquivos gerados: {MODEL_PATH}, {TOKENIZER_PATH}, {RESPOSTAS_PATH}")
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument("--force", action="store_true", help="treina mesmo que nada tenha mudado (sem warm start)")
+    p.add_argument("--no-warm-start", action="store_false", dest="warm_start", help="sempre treina do zero")
+    p.add_argument("--max-epochs", type=int, default=DEFAULT_HPARAMS["max_epochs"], dest="max_epochs")
+    p.add_argument("--batch-size", type=int, default=DEFAULT_HPARAMS["batch_size"], dest="batch_size")
+    args = p.parse_args()
+    train(
+        hparams={"max_epochs": args.max_epochs, "batch_size": args.batch_size},
+        force=args.force,
+        warm_start=args.warm_start,
+    )
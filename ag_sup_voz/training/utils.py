@@ -16,3 +16,8 @@ def texto_para_sequencia(tokenizer: Tokenizer, texto: str, max_len: int = 10) ->
     """Converte um texto em uma sequência de tokens e aplica padding."""
     seq = tokenizer.texts_to_sequences([texto])
     return pad_sequences(seq, maxlen=max_len)
+
+def textos_para_sequencias(tokenizer: Tokenizer, textos: list, max_len: int = 10) -> np.ndarray:
+    """Converte vários textos de uma vez (mais rápido que um a um em bases grandes)."""
+    seqs = tokenizer.texts_to_sequences(textos)
+    return pad_sequences(seqs, maxlen=max_len)